@@ -1,40 +1,76 @@
 # beauty/admin.py
 
 from django.contrib import admin
-from .models import Taxon, Item, Notification, LlmSuggestionLog
+from django.db import transaction
+from .models import (
+    Taxon, Item, Notification, NotificationArchive, NotificationCounter, NotificationReadMark, LlmSuggestionLog,
+)
 
 @admin.register(Taxon)
 class TaxonAdmin(admin.ModelAdmin):
     list_display = ('name', 'parent', 'depth', 'full_path', 'is_leaf')
-    list_filter = ('depth',)
+    list_filter = ('depth', 'is_leaf')
     search_fields = ('name', 'full_path')
     ordering = ('depth', 'name')
-    
-    def is_leaf(self, obj):
-        return obj.is_leaf
-    is_leaf.boolean = True
-    is_leaf.short_description = '葉ノード'
+    actions = ('rebuild_paths',)
+
+    @admin.action(description='選択したカテゴリ以下の階層・フルパスを再計算')
+    def rebuild_paths(self, request, queryset):
+        updated = sum(Taxon.rebuild_paths(taxon_id) for taxon_id in queryset.values_list('id', flat=True))
+        self.message_user(request, f'{updated}件のカテゴリを更新しました。')
 
 @admin.register(Item)
 class ItemAdmin(admin.ModelAdmin):
     list_display = ('name', 'product_type', 'brand', 'status', 'expires_on', 'risk_flag')
-    list_filter = ('status', 'risk_flag', 'product_type__parent__parent')
+    list_filter = ('status', 'risk_flag', 'category_root', 'category_middle')
     search_fields = ('name', 'brand', 'product_type__full_path')
     date_hierarchy = 'expires_on'
     
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == "product_type":
             # 葉ノードのみ選択可能
-            kwargs["queryset"] = Taxon.objects.filter(children__isnull=True)
+            kwargs["queryset"] = Taxon.objects.filter(is_leaf=True)
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
+    def save_model(self, request, obj, form, change):
+        # 管理画面で期限・ステータスを変えた場合も次回通知日を追従させる
+        obj.refresh_next_alert()
+        super().save_model(request, obj, form, change)
+
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ('user', 'item', 'type', 'title', 'scheduled_for', 'read_at', 'created_at')
-    list_filter = ('type', 'read_at', 'created_at')
+    list_display = ('user', 'item', 'type', 'title', 'item_count', 'scheduled_for', 'created_at')
+    list_filter = ('type', 'created_at')
+    search_fields = ('title', 'body')
+    date_hierarchy = 'scheduled_for'
+    readonly_fields = ('created_at', 'rendered_body')
+
+    def rendered_body(self, obj):
+        return obj.render_body()
+    rendered_body.short_description = '表示本文'
+
+    def delete_model(self, request, obj):
+        # 削除する通知が未読なら未読数から引く
+        with transaction.atomic():
+            NotificationCounter.discard(Notification.objects.filter(pk=obj.pk))
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            NotificationCounter.discard(queryset)
+            super().delete_queryset(request, queryset)
+
+@admin.register(NotificationReadMark)
+class NotificationReadMarkAdmin(admin.ModelAdmin):
+    list_display = ('user', 'type', 'read_through', 'updated_at')
+    list_filter = ('type',)
+
+@admin.register(NotificationArchive)
+class NotificationArchiveAdmin(admin.ModelAdmin):
+    list_display = ('user', 'item_ref_id', 'type', 'title', 'item_count', 'scheduled_for', 'read_at', 'archived_at')
+    list_filter = ('type', 'archived_at')
     search_fields = ('title', 'body')
     date_hierarchy = 'scheduled_for'
-    readonly_fields = ('created_at',)
 
 @admin.register(LlmSuggestionLog)
 class LlmSuggestionLogAdmin(admin.ModelAdmin):
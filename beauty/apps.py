@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class BeautyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'beauty'
-    verbose_name = 'CosmeLimiter / コスメリミッター'
\ No newline at end of file
+    verbose_name = 'CosmeLimiter / コスメリミッター'
+
+    def ready(self):
+        from . import signals  # noqa: F401  シグナル受信関数の登録
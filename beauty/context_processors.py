@@ -0,0 +1,13 @@
+# beauty/context_processors.py
+from django.core.handlers.asgi import ASGIRequest
+from django.urls import reverse
+
+
+def notification_stream(request):
+    """
+    通知バッジの SSE の接続先（ASGI で動かしているときだけ）
+    WSGI では空にして接続用のスクリプトも読み込ませない（JS は JSON サマリーを1回取得する）
+    """
+    if isinstance(request, ASGIRequest):
+        return {'notification_stream_url': reverse('beauty:notifications_stream')}
+    return {'notification_stream_url': ''}
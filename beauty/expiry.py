@@ -0,0 +1,71 @@
+# beauty/expiry.py
+"""
+使用期限の区分（期限切れ / 7日以内 / 14日以内 / 30日以内 / 余裕あり）
+一覧タブ・期限別グラフ・ホームで同じ境界を使うための共通処理
+- 区分は Item.risk_flag に保存する（保存時に計算し、日付が変わった分は refresh_risk_flags で更新）
+- 画面の表示は bucket_for で期限日から直接判定する（risk_flag はタブの絞り込みと件数用）
+"""
+from datetime import timedelta
+from django.db.models import Count, Q
+
+# 区分キー（表示順）
+EXPIRY_BUCKETS = ('expired', 'week', 'biweek', 'month', 'safe')
+
+# 区分ごとの表示（テンプレートの risk_level, 文言, 詳細画面の色クラス）
+RISK_DISPLAY = {
+    'expired': ('expired', '期限切れ', 'danger'),
+    'week': ('critical', '期限7日以内', 'warning'),
+    'biweek': ('warning', '期限14日以内', 'warning-orange'),
+    'month': ('caution', '期限30日以内', 'fine'),
+    'safe': ('safe', '余裕あり', 'safety'),
+}
+
+
+def bucket_for(expires_on, today):
+    """期限日の区分キー（bucket_q と同じ境界）"""
+    days = (expires_on - today).days
+    if days < 0:
+        return 'expired'
+    if days <= 7:
+        return 'week'
+    if days <= 14:
+        return 'biweek'
+    if days <= 30:
+        return 'month'
+    return 'safe'
+
+
+def bucket_q(bucket, today):
+    """区分キーに対応する絞り込み条件（相互排他）。不正なキーは None"""
+    d7 = today + timedelta(days=7)
+    d14 = today + timedelta(days=14)
+    d30 = today + timedelta(days=30)
+    conditions = {
+        # 期限切れ：今日より前
+        'expired': Q(expires_on__lt=today),
+        # 7日以内：今日〜7日後（含む）
+        'week': Q(expires_on__gte=today, expires_on__lte=d7),
+        # 14日以内：8〜14日後
+        'biweek': Q(expires_on__gte=d7 + timedelta(days=1), expires_on__lte=d14),
+        # 30日以内：15〜30日後
+        'month': Q(expires_on__gte=d14 + timedelta(days=1), expires_on__lte=d30),
+        # 余裕あり：30日超
+        'safe': Q(expires_on__gt=d30),
+    }
+    return conditions.get(bucket)
+
+
+def flag_counts(qs, include_all=False):
+    """
+    保存済みの区分（risk_flag）ごとの件数を1クエリで返す
+    include_all=True のときは 'all'（全件数）も含める
+    """
+    counts = dict.fromkeys(EXPIRY_BUCKETS, 0)
+    total = 0
+    for flag, n in qs.order_by().values_list('risk_flag').annotate(n=Count('id')):
+        total += n
+        if flag in counts:
+            counts[flag] = n
+    if include_all:
+        counts['all'] = total
+    return counts
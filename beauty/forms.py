@@ -2,7 +2,8 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from .models import Item, Taxon
+from .models import Item, Taxon, UserProfile
+from . import taxonomy
 import re
 
 
@@ -134,7 +135,7 @@ class ItemForm(forms.ModelForm):
     """アイテム登録フォーム"""
     
     product_type = forms.ModelChoiceField(
-        queryset=Taxon.objects.filter(children__isnull=True),  # 葉ノードのみ
+        queryset=Taxon.objects.filter(is_leaf=True),  # 葉ノードのみ
         widget=forms.Select(attrs={
             'class': 'form-select',
             'id': 'id_product_type'
@@ -224,13 +225,8 @@ class ItemForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # カテゴリの選択肢を階層的に表示
-        leaf_taxons = Taxon.objects.filter(children__isnull=True).select_related('parent')
         choices = [('', 'カテゴリを選択してください')]
-        
-        for taxon in leaf_taxons:
-            display_name = taxon.full_path or taxon.name
-            choices.append((taxon.pk, display_name))
-        
+        choices.extend(taxonomy.get_snapshot().leaf_choices())
         self.fields['product_type'].choices = choices
     
     def clean(self):
@@ -270,6 +266,18 @@ class UserSettingsForm(forms.Form):
         label='通知を受け取る',
         required=False
     )
+
+    timezone = forms.ChoiceField(
+        choices=UserProfile.TIMEZONE_CHOICES,
+        initial=UserProfile.DEFAULT_TIMEZONE,
+        widget=forms.Select(attrs={
+            'class': 'form-select',
+            'id': 'timezone'
+        }),
+        label='タイムゾーン',
+        help_text='通知はこのタイムゾーンの日付で作成されます。',
+        required=False
+    )
     
 
 class PasswordChangeForm(forms.Form):
@@ -0,0 +1,178 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery
+from datetime import timedelta
+import os
+import socket
+import time
+import uuid
+from beauty.models import CommandLease, Notification, NotificationArchive, NotificationCounter, NotificationReadMark
+
+
+# 既読から何日経った通知を対象にするか
+DEFAULT_DAYS = 90
+
+# 1トランザクションで移動・削除する件数
+DEFAULT_BATCH_SIZE = 1000
+
+# バッチ間の待ち時間（秒）。Web リクエストの書き込みを先に通すため
+DEFAULT_SLEEP = 0.1
+
+# リースの有効期限（秒）
+DEFAULT_LEASE_TTL = 600
+
+
+class Command(BaseCommand):
+    help = '保持期間を過ぎた既読通知をアーカイブテーブルへ移動（または削除）します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=DEFAULT_DAYS,
+            help=f'通知予定時刻からこの日数を過ぎた既読通知を対象にする（デフォルト: {DEFAULT_DAYS}）',
+        )
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            help='アーカイブせずに削除する',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'1トランザクションで処理する件数（デフォルト: {DEFAULT_BATCH_SIZE}）',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=DEFAULT_SLEEP,
+            help=f'バッチ間の待ち時間（秒、デフォルト: {DEFAULT_SLEEP}）',
+        )
+        parser.add_argument(
+            '--vacuum',
+            action='store_true',
+            help='SQLite で auto_vacuum=INCREMENTAL でない場合に VACUUM を実行する（実行中は DB 全体がロックされる）',
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days は 1 以上で指定してください。')
+        batch_size = max(1, options['batch_size'])
+        sleep = max(0.0, options['sleep'])
+
+        lease_name = 'archive_notifications'
+        lease_owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        acquired, _ = CommandLease.acquire(lease_name, lease_owner, DEFAULT_LEASE_TTL)
+        if not acquired:
+            self.stdout.write(self.style.WARNING(f'{lease_name} は他のプロセスが実行中のため終了します。'))
+            return
+
+        try:
+            before = self._sqlite_stats()
+            cutoff = timezone.now() - timedelta(days=options['days'])
+            moved, elapsed = self._move(cutoff, options['delete'], batch_size, sleep, lease_name, lease_owner)
+            self._report(moved, elapsed, options['delete'], cutoff)
+            if before:
+                self._reclaim(before, options['vacuum'])
+        finally:
+            CommandLease.release(lease_name, lease_owner)
+
+    def _move(self, cutoff, delete, batch_size, sleep, lease_name, lease_owner):
+        """対象通知を id のキーセットで batch_size 件ずつ移動し、バッチごとにコミットする"""
+        targets = read_notifications_before(cutoff)
+        moved = 0
+        last_id = 0
+        started = time.monotonic()
+        while True:
+            batch_started = time.monotonic()
+            with transaction.atomic():
+                rows = list(targets.filter(id__gt=last_id)[:batch_size])
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                if not delete:
+                    # original_id の一意制約で、途中で中断した後の再実行でも二重に入らない
+                    NotificationArchive.objects.bulk_create(
+                        [NotificationArchive.from_notification(n, read_at=n.read_through) for n in rows],
+                        batch_size=batch_size,
+                        ignore_conflicts=True,
+                    )
+                batch = Notification.objects.filter(id__in=[n.id for n in rows])
+                # 削除する通知に未読の分があれば未読数から引く（既読だけを対象にしているので通常は0件）
+                NotificationCounter.discard(batch)
+                batch.delete()
+
+            moved += len(rows)
+            self.stdout.write(f'  ~id {last_id}: {len(rows)}件 ({time.monotonic() - batch_started:.2f}秒)')
+            CommandLease.heartbeat(lease_name, lease_owner, DEFAULT_LEASE_TTL)
+            if sleep:
+                time.sleep(sleep)
+        return moved, time.monotonic() - started
+
+    def _report(self, moved, elapsed, delete, cutoff):
+        action = '削除' if delete else 'アーカイブ'
+        rate = moved / elapsed if elapsed > 0 else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{action}完了: {moved}件 (基準 {cutoff:%Y-%m-%d %H:%M}, {elapsed:.2f}秒, {rate:.0f}件/秒)'
+            )
+        )
+
+    def _sqlite_stats(self):
+        """SQLite のページ数・空きページ数・ページサイズを返す（SQLite 以外は None）"""
+        if connection.vendor != 'sqlite':
+            return None
+        with connection.cursor() as cursor:
+            stats = {}
+            for pragma in ('page_count', 'freelist_count', 'page_size', 'auto_vacuum'):
+                cursor.execute(f'PRAGMA {pragma}')
+                stats[pragma] = cursor.fetchone()[0]
+        return stats
+
+    def _reclaim(self, before, vacuum):
+        """
+        空きページをファイルから切り詰め、前後のサイズを報告する
+        - auto_vacuum=INCREMENTAL(2): incremental_vacuum（短時間で済む）
+        - それ以外: --vacuum 指定時のみ VACUUM（空きページは次の INSERT で再利用される）
+        """
+        after_delete = self._sqlite_stats()
+        if before['auto_vacuum'] == 2:
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA incremental_vacuum')
+                cursor.fetchall()
+            mode = 'incremental_vacuum'
+        elif vacuum:
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+            mode = 'VACUUM'
+        else:
+            mode = None
+        after = self._sqlite_stats()
+
+        page_size = before['page_size']
+        self.stdout.write(
+            f"  SQLite: {before['page_count'] * page_size / 1024:.0f}KB → "
+            f"{after['page_count'] * page_size / 1024:.0f}KB "
+            f"(空きページ {after_delete['freelist_count']} → {after['freelist_count']})"
+        )
+        if mode:
+            reclaimed = (before['page_count'] - after['page_count']) * page_size
+            self.stdout.write(f'  {mode} で {reclaimed / 1024:.0f}KB を解放しました')
+        elif after_delete['freelist_count']:
+            self.stdout.write('  空きページは再利用されます（ファイルを縮めるには --vacuum を指定）')
+
+
+def read_notifications_before(cutoff):
+    """通知予定時刻が cutoff より前の既読通知（既読 = 同じユーザー・種別の既読位置以前）を id 順で返す"""
+    read_through = NotificationReadMark.objects.filter(
+        user=OuterRef('user_id'), type=OuterRef('type')
+    ).values('read_through')
+    return (
+        Notification.objects
+        .filter(scheduled_for__lt=cutoff)
+        .annotate(read_through=Subquery(read_through))
+        .filter(read_through__gte=F('scheduled_for'))
+        .order_by('id')
+    )
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+import time
+from beauty.models import Item, TaxonClosure
+
+
+# 1トランザクションで更新するアイテム数
+DEFAULT_BATCH_SIZE = 1000
+
+# バッチ間の待ち時間（秒）。Web リクエストの書き込みを先に通すため
+DEFAULT_SLEEP = 0.05
+
+
+class Command(BaseCommand):
+    help = (
+        'アイテムの大分類・中分類（category_root / category_middle）を商品カテゴリから補完・修正します'
+        '（既存アイテムはマイグレーション 0015 で設定済み。ずれた場合の修復用）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'1トランザクションで処理する件数（デフォルト: {DEFAULT_BATCH_SIZE}）',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=DEFAULT_SLEEP,
+            help=f'バッチ間の待ち時間（秒、デフォルト: {DEFAULT_SLEEP}）',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        started = time.monotonic()
+        scanned = 0
+        updated = 0
+        last_id = 0
+
+        while True:
+            # id のキーセットで少しずつ進める（ロックを短く保つ）
+            with transaction.atomic():
+                batch = list(
+                    Item.objects.filter(id__gt=last_id).order_by('id')
+                    .only('id', 'product_type_id', 'category_root_id', 'category_middle_id')[:batch_size]
+                )
+                if not batch:
+                    break
+                levels = TaxonClosure.category_levels({item.product_type_id for item in batch})
+                changed = []
+                for item in batch:
+                    root_id, middle_id = levels.get(item.product_type_id, (None, None))
+                    if (item.category_root_id, item.category_middle_id) != (root_id, middle_id):
+                        item.category_root_id, item.category_middle_id = root_id, middle_id
+                        changed.append(item)
+                Item.objects.bulk_update(changed, ['category_root', 'category_middle'])
+
+            scanned += len(batch)
+            updated += len(changed)
+            last_id = batch[-1].id
+            if options['sleep'] > 0:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'大分類・中分類を補完しました: {scanned}件中 {updated}件を更新（{time.monotonic() - started:.2f}秒）'
+            )
+        )
@@ -0,0 +1,130 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.db import connection
+from django.db.models import Count
+from datetime import timedelta
+import io
+from beauty.expiry import flag_counts
+from beauty.search import fts_available, search_items
+from beauty.models import Item, Notification, NotificationCounter, NotificationWatermark, UserProfile
+from beauty.views import get_all_items_qs, paginate_by_keyset
+from beauty.management.commands import archive_notifications, generate_notifications, refresh_risk_flags
+
+
+class Command(BaseCommand):
+    help = 'views.py と通知バッチの主要クエリの実行計画（EXPLAIN QUERY PLAN）を表示します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='クエリに使うユーザーID（省略時はアイテムが最も多いユーザー）',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN は SQLite でのみ対応しています。')
+
+        user_id = options['user'] or self._sample_user_id()
+        if user_id is None:
+            raise CommandError('ユーザーがいません。')
+        today = timezone.localdate()
+
+        full_scans = 0
+        for label, run in self._hot_queries(user_id, today):
+            self.stdout.write(self.style.MIGRATE_HEADING(f'■ {label}'))
+            for sql, params in self._capture(run):
+                for line in self._explain(sql, params):
+                    # インデックスを使わない SCAN はテーブル全件走査
+                    if line.startswith('SCAN ') and ' USING ' not in line:
+                        full_scans += 1
+                        self.stdout.write(self.style.WARNING(f'  {line}'))
+                    else:
+                        self.stdout.write(f'  {line}')
+
+        if full_scans:
+            self.stdout.write(self.style.WARNING(f'全件走査: {full_scans}箇所'))
+        else:
+            self.stdout.write(self.style.SUCCESS('全件走査はありません'))
+
+    def _sample_user_id(self):
+        row = Item.objects.values('user_id').annotate(n=Count('id')).order_by('-n').first()
+        if row:
+            return row['user_id']
+        return get_user_model().objects.order_by('id').values_list('id', flat=True).first()
+
+    def _hot_queries(self, user_id, today):
+        """(表示名, 実行する関数) の一覧。すべて読み取りのみ"""
+        items = Item.objects.filter(user_id=user_id)
+        first_page, cursor = paginate_by_keyset(items, 'expires_on', '')
+        gen = generate_notifications.Command(stdout=io.StringIO())
+        watermark = NotificationWatermark(last_run_on=today - timedelta(days=1), last_item_updated_at=timezone.now())
+        scope = gen._scope(today, watermark) & gen._timezone_scope('Asia/Tokyo')
+        full_scope = gen._scope(today, None) & gen._timezone_scope('Asia/Tokyo')
+        tz_scope = UserProfile.timezone_q('Asia/Tokyo')
+        # 2シャードで分担したときの1シャード分のユーザーIDブロック
+        blocks = gen._user_blocks(2, 0)
+        batch_ids = sorted(item_id for item_id, _ in generate_notifications.due_item_ids(today, scope))[:500]
+        fts_available()  # FTS 索引の有無の確認（sqlite_master の走査）を計画の表示に混ぜない
+
+        return [
+            ('item_list: タブ件数（期限区分ごと）', lambda: flag_counts(items, include_all=True)),
+            ('item_list: 期限順 1ページ目', lambda: paginate_by_keyset(items, 'expires_on', '')),
+            ('item_list: 期限順 続き（キーセット）', lambda: paginate_by_keyset(items, 'expires_on', cursor)),
+            ('item_list: 登録日の新しい順', lambda: paginate_by_keyset(items, '-created_at', '')),
+            ('item_list: 7日以内タブ', lambda: paginate_by_keyset(items.filter(risk_flag='week'), 'expires_on', '')),
+            ('item_list: 検索（関連度順）', lambda: paginate_by_keyset(search_items(items, '高保湿 化粧水')[0], 'search_rank', '')),
+            ('expiry_stats / home: 期限別件数', lambda: flag_counts(items)),
+            ('refresh_risk_flags: 30日以内に移った行', lambda: list(
+                refresh_risk_flags.stale_rows('month', today, tz_scope).values_list('id', flat=True)[:1000]
+            )),
+            ('refresh_risk_flags: 期限切れに移った行', lambda: list(
+                refresh_risk_flags.stale_rows('expired', today, tz_scope).values_list('id', flat=True)[:1000]
+            )),
+            ('home: 最近登録されたアイテム', lambda: list(get_all_items_qs(user_id)[:4])),
+            ('get_notifications_summary: 未読カウンタ', lambda: NotificationCounter.objects.filter(user_id=user_id).first()),
+            ('未読カウンタの再集計', lambda: NotificationCounter.compute([user_id])),
+            # 実行時と同じく、担当ブロックの対象の id を先に引いてから主キーでバッチを読む
+            ('generate_notifications: 差分対象の id', lambda: generate_notifications.due_item_ids(today, scope, blocks)),
+            ('generate_notifications: 既定の対象の id', lambda: generate_notifications.due_item_ids(today)),
+            ('generate_notifications: 担当ブロックの既定の対象の id', lambda: generate_notifications.due_item_ids(
+                today, blocks=blocks
+            )),
+            ('generate_notifications: フルスキャン対象の id（--full）', lambda: generate_notifications.due_item_ids(
+                today, full_scope, blocks, full=True
+            )),
+            ('generate_notifications: バッチの読み込み', lambda: list(
+                generate_notifications.due_items(batch_ids, today)
+            )),
+            ('generate_notifications: 今日の通知の有無', lambda: generate_notifications._existing_item_notifications(
+                [{'id': item_id} for item_id in batch_ids], today
+            )),
+            ('generate_notifications: 既存ダイジェスト', lambda: generate_notifications._existing_digests(
+                [{'user_id': user_id}], today
+            )),
+            ('archive_notifications: 移動対象', lambda: list(
+                archive_notifications.read_notifications_before(timezone.now() - timedelta(days=90))
+                .filter(id__gt=0)[:1000]
+            )),
+            ('mark_notifications_read: 同種別の未読', lambda: Notification.objects.filter(
+                user_id=user_id, type='D7', scheduled_for__gt=timezone.now()
+            ).exists()),
+        ]
+
+    def _capture(self, run):
+        """run() が発行した SQL とパラメータを集める"""
+        captured = []
+
+        def wrapper(execute, sql, params, many, context):
+            captured.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(wrapper):
+            run()
+        return captured
+
+    def _explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
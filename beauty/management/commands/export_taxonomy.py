@@ -0,0 +1,95 @@
+from django.core.management.base import BaseCommand, CommandError
+import csv
+import json
+import sys
+from beauty.models import Taxon
+
+
+FORMATS = ('json', 'csv')
+
+# CSV の path 列の区切り（full_path と同じ）
+PATH_SEPARATOR = ' > '
+
+
+def format_path(names):
+    """CSV の path 列の値。区切りを含む名前があるときは区切らずに JSON の配列で書く"""
+    if any(PATH_SEPARATOR in name for name in names):
+        return json.dumps(names, ensure_ascii=False)
+    return PATH_SEPARATOR.join(names)
+
+
+def parse_path(value):
+    """format_path の逆。JSON の配列として読めなければ区切り（前後の空白を含む ' > '）で分ける"""
+    if value.startswith('['):
+        try:
+            names = json.loads(value)
+        except ValueError:
+            names = None
+        if isinstance(names, list) and all(isinstance(name, str) for name in names):
+            return names
+    return value.split(PATH_SEPARATOR)
+
+
+def taxonomy_rows():
+    """カテゴリを親から順に (名前の列, 期限月数, 基準日) で返す"""
+    taxa = list(
+        Taxon.objects.order_by('depth', 'name')
+        .values_list('id', 'name', 'parent_id', 'shelf_life_months', 'shelf_life_anchor')
+    )
+    by_id = {t[0]: t for t in taxa}
+
+    def path(taxon):
+        names = []
+        while taxon is not None:
+            names.append(taxon[1])
+            taxon = by_id.get(taxon[2])
+        return list(reversed(names))
+
+    rows = [(path(t), t[3], t[4]) for t in taxa]
+    # 親が必ず子より先に来るよう階層順に並べる
+    rows.sort(key=lambda row: (len(row[0]), row[0]))
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'カテゴリ木を JSON または CSV で書き出します（import_taxonomy で読み込める形式）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='出力形式（省略時は --output の拡張子、それも無ければ json）',
+        )
+        parser.add_argument(
+            '--output',
+            help='出力ファイル（省略時は標準出力）',
+        )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or (output.rsplit('.', 1)[-1].lower() if output and '.' in output else 'json')
+        if fmt not in FORMATS:
+            raise CommandError(f'対応していない形式です: {fmt}')
+
+        rows = taxonomy_rows()
+        stream = open(output, 'w', encoding='utf-8', newline='') if output else sys.stdout
+        try:
+            if fmt == 'json':
+                json.dump(
+                    [{'path': path, 'shelf_life_months': months, 'shelf_life_anchor': anchor} for path, months, anchor in rows],
+                    stream,
+                    ensure_ascii=False,
+                    indent=2,
+                )
+                stream.write('\n')
+            else:
+                writer = csv.writer(stream)
+                writer.writerow(['path', 'shelf_life_months', 'shelf_life_anchor'])
+                for path, months, anchor in rows:
+                    writer.writerow([format_path(path), months, anchor])
+        finally:
+            if output:
+                stream.close()
+
+        if output:
+            self.stdout.write(self.style.SUCCESS(f'{len(rows)}件のカテゴリを書き出しました: {output}'))
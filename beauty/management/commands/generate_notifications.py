@@ -1,119 +1,559 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
 from django.utils import timezone
-from django.db import transaction
+from django.db import connections, transaction
+from django.db.models import F, Max, Min, Q
+from bisect import bisect_right
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from datetime import date, timedelta
+import multiprocessing
+import os
+import socket
+import time
+import uuid
 import zoneinfo
-from beauty.models import Item, Notification
+from beauty.models import (
+    CommandLease, Item, Notification, NotificationCounter, NotificationReadMark, NotificationWatermark,
+    UserProfile,
+)
+
+
+# bulk_create / bulk_update 1回あたりの件数
+DEFAULT_BATCH_SIZE = 500
+
+# 1トランザクションで処理するユーザーIDの幅
+DEFAULT_RANGE_SIZE = 5000
+
+# リースとウォーターマークの単位となるユーザーIDブロックの幅
+# 実行オプション（--shards / --range-size）に依存しない固定の区切りにし、
+# 分割数の違う実行どうしでも同じユーザーを同じリースで守る
+USER_BLOCK_SIZE = 5000
+
+# リースの有効期限（秒）。この間ハートビートが無ければ他の実行が引き継ぐ
+DEFAULT_LEASE_TTL = 600
+
+# 通知種別 -> (集計キー, タイトル)
+NOTIFICATION_SPECS = {
+    'OVERWEEK': ('expired', '使用期限切れのアイテムがあります'),
+    'D7':       ('week',    '期限7日以内のアイテムがあります'),
+    'D14':      ('biweek',  '期限14日以内のアイテムがあります'),
+    'D30':      ('month',   '期限30日以内のアイテムがあります'),
+}
 
 
 class Command(BaseCommand):
     help = 'コスメアイテムの使用期限に基づいて通知を生成します'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'一括INSERTのバッチサイズ（デフォルト: {DEFAULT_BATCH_SIZE}）',
+        )
+        parser.add_argument(
+            '--shards',
+            type=int,
+            default=1,
+            help=f'ユーザーIDブロック（{USER_BLOCK_SIZE}件刻み）を分担するシャード数（複数ホストで分担する場合に指定）',
+        )
+        parser.add_argument(
+            '--shard-index',
+            type=int,
+            default=0,
+            help='このホストが担当する分割番号（0始まり）',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='並列実行するプロセス数',
+        )
+        parser.add_argument(
+            '--range-size',
+            type=int,
+            default=DEFAULT_RANGE_SIZE,
+            help=f'1トランザクションで処理するユーザーIDの幅（デフォルト・上限: {DEFAULT_RANGE_SIZE}）',
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='ウォーターマークを使わず使用中アイテムをすべて再スキャンする',
+        )
+        parser.add_argument(
+            '--lease-ttl',
+            type=int,
+            default=DEFAULT_LEASE_TTL,
+            help=f'多重起動防止リースの有効期限（秒、デフォルト: {DEFAULT_LEASE_TTL}）',
+        )
+        parser.add_argument(
+            '--hourly',
+            action='store_true',
+            help='毎時実行用: 現地の今日の分がまだ処理されていないタイムゾーンのユーザーだけを処理する',
+        )
+        parser.add_argument(
+            '--digest',
+            action='store_true',
+            help='ユーザー・種別・日付ごとに1件のダイジェスト通知にまとめる',
+        )
+
     def handle(self, *args, **options):
         """通知生成のメイン処理"""
-        tokyo_tz = zoneinfo.ZoneInfo('Asia/Tokyo')
-        now_tokyo = timezone.now().astimezone(tokyo_tz)
-        today_tokyo = now_tokyo.date()
-        
-        self.stdout.write(f"通知生成開始: {today_tokyo} ({now_tokyo.strftime('%A')})")
-        
-        created_counts = {
-            'expired': 0,
-            'week': 0,
-            'biweek': 0,
-            'month': 0
-        }
-        
-        with transaction.atomic():
-            # 期限切れ通知（毎週月曜日のみ）
-            if now_tokyo.weekday() == 0:  # 月曜日 (0=月曜日)
-                created_counts['expired'] = self._generate_expired_notifications(today_tokyo)
-            
-            # 30日以内通知
-            created_counts['month'] = self._generate_expiry_notifications(
-                today_tokyo, 30, 'D30', '期限30日以内のアイテムがあります'
-            )
-            
-            # 14日以内通知
-            created_counts['biweek'] = self._generate_expiry_notifications(
-                today_tokyo, 14, 'D14', '期限14日以内のアイテムがあります'
+        batch_size = max(1, options['batch_size'])
+        range_size = min(max(1, options['range_size']), USER_BLOCK_SIZE)
+        shards = options['shards']
+        shard_index = options['shard_index']
+        workers = options['workers']
+
+        if shards < 1 or not 0 <= shard_index < shards:
+            raise CommandError('--shard-index は 0 以上 --shards 未満で指定してください。')
+        if workers < 1:
+            raise CommandError('--workers は 1 以上で指定してください。')
+
+        # 担当ブロックごとにリースを取得する（他の実行が処理中のブロックは飛ばす）
+        # リースはシャードではなくユーザーIDブロックに付くため、分割数の違う実行が重なっても同じユーザーは処理しない
+        self.lease_owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.lease_ttl = max(30, options['lease_ttl'])
+        self.lease_names = []
+        blocks = []
+        for lo, hi in self._user_blocks(shards, shard_index):
+            lease_name = block_key(lo, hi)
+            acquired, previous_owner = CommandLease.acquire(lease_name, self.lease_owner, self.lease_ttl)
+            if not acquired:
+                self.stdout.write(self.style.WARNING(f'{lease_name} は他のプロセスが実行中のため飛ばします。'))
+                continue
+            if previous_owner:
+                self.stdout.write(self.style.WARNING(
+                    f'{lease_name} の期限切れのリースを引き継ぎました（前の保持者: {previous_owner}）'
+                ))
+            self.lease_names.append(lease_name)
+            blocks.append((lo, hi))
+        if not blocks:
+            self.stdout.write('処理できるユーザーIDブロックが無いため終了します。')
+            return
+
+        try:
+            self._generate(
+                blocks, shards, shard_index, workers, batch_size, range_size,
+                options['full'], options['hourly'], options['digest'],
             )
-            
-            # 7日以内通知
-            created_counts['week'] = self._generate_expiry_notifications(
-                today_tokyo, 7, 'D7', '期限7日以内のアイテムがあります'
+        finally:
+            CommandLease.release_many(self.lease_names, self.lease_owner)
+
+    def _generate(self, blocks, shards, shard_index, workers, batch_size, range_size, full, hourly, digest):
+        """リース取得後の通知生成本体（タイムゾーンごとにユーザーの現地日付で処理する）"""
+        now = timezone.now()
+        timezones = self._target_timezones(now, hourly, blocks)
+        if not timezones:
+            self.stdout.write('今日の分が未処理のタイムゾーンが無いため終了します。')
+            return
+
+        self.stdout.write(
+            f"通知生成開始: {now:%Y-%m-%d %H:%M} UTC "
+            f"shard {shard_index + 1}/{shards}, blocks={len(blocks)}, workers={workers}, timezones={len(timezones)}"
+            f"{', digest' if digest else ''}"
+        )
+
+        # この時点の最大更新日時を次回の差分基準にする
+        high_updated_at = Item.objects.aggregate(v=Max('updated_at'))['v']
+        created_counts = {key: 0 for key, _ in NOTIFICATION_SPECS.values()}
+        started = time.monotonic()
+        range_count = 0
+
+        for tz_name in timezones:
+            now_local = now.astimezone(zoneinfo.ZoneInfo(tz_name))
+            today_local = now_local.date()
+            self.stdout.write(f"[{tz_name}] {today_local} ({now_local.strftime('%A')})")
+
+            # 差分実行の基準（ブロック × タイムゾーンごと）。基準が同じブロックはまとめて1回で対象を引く
+            keys = {block: f'{block_key(*block)}:{tz_name}' for block in blocks}
+            watermarks = {} if full else NotificationWatermark.objects.in_bulk(keys.values(), field_name='key')
+            groups = {}
+            for block in blocks:
+                watermark = watermarks.get(keys[block])
+                basis = (watermark.last_run_on, watermark.last_item_updated_at) if watermark else None
+                groups.setdefault(basis, (watermark, []))[1].append(block)
+
+            for watermark, group_blocks in groups.values():
+                scope = self._scope(today_local, watermark) & self._timezone_scope(tz_name)
+                # 期限切れ通知は週1回（月曜日）。前回の実行から今日までに月曜日があれば遅れた分も含める
+                include_expired = passed_monday(watermark.last_run_on if watermark else None, today_local)
+                ranges = [
+                    (lo, min(lo + range_size, hi))
+                    for block_lo, hi in group_blocks
+                    for lo in range(block_lo, hi, range_size)
+                ]
+                range_count += len(ranges)
+
+                # 担当ブロックの対象アイテムを索引で先に読み、ユーザーID範囲ごとに振り分ける（対象の無い範囲は処理しない）
+                range_ids = assign_ranges(ranges, due_item_ids(today_local, scope, group_blocks, watermark is None))
+
+                for lo, hi, counts, elapsed in self._run_ranges(
+                    range_ids, workers, today_local, include_expired, batch_size, digest
+                ):
+                    for key, count in counts.items():
+                        created_counts[key] += count
+                    self.stdout.write(f'  users[{lo}, {hi}): {sum(counts.values())}件 ({elapsed:.2f}秒)')
+
+            # このタイムゾーンの全範囲が成功した場合のみウォーターマークを進める
+            NotificationWatermark.objects.bulk_create(
+                [
+                    NotificationWatermark(
+                        key=key, last_run_on=today_local, last_item_updated_at=high_updated_at, updated_at=now,
+                    )
+                    for key in keys.values()
+                ],
+                update_conflicts=True,
+                unique_fields=['key'],
+                update_fields=['last_run_on', 'last_item_updated_at', 'updated_at'],
             )
-        
+
         # 結果出力
         total_created = sum(created_counts.values())
         self.stdout.write(
-            self.style.SUCCESS(f'通知生成完了: 合計{total_created}件')
+            self.style.SUCCESS(
+                f'通知生成完了: 合計{total_created}件 '
+                f'({len(timezones)}タイムゾーン, のべ{range_count}範囲, {time.monotonic() - started:.2f}秒)'
+            )
         )
-        
+
         for notification_type, count in created_counts.items():
             if count > 0:
                 self.stdout.write(f'  {notification_type}: {count}件')
 
-    def _generate_expired_notifications(self, today):
-        """期限切れ通知を生成（週次・月曜日のみ）"""
-        expired_items = Item.objects.filter(
-            expires_on__lt=today,
-            status='using'
-        ).select_related('user')
-        
-        created_count = 0
-        for item in expired_items:
-            # 重複チェック: 同じユーザー・アイテム・タイプの通知が既に存在するか
-            existing = Notification.objects.filter(
-                user=item.user,
-                item=item,
-                type='OVERWEEK',
-                scheduled_for__date=today
-            ).exists()
-            
-            if not existing:
-                Notification.objects.create(
-                    user=item.user,
-                    item=item,
-                    type='OVERWEEK',
-                    title='使用期限切れのアイテムがあります',
-                    body=f'{item.name}の使用期限が過ぎています（期限: {item.expires_on}）',
-                    scheduled_for=timezone.now()
-                )
-                created_count += 1
-        
-        return created_count
-
-    def _generate_expiry_notifications(self, today, days_threshold, notification_type, title):
-        """指定期間以内の期限通知を生成（1回のみ）"""
-        target_date = today + timedelta(days=days_threshold)
-        
-        # 期限がdays_threshold日以内（当日含む）のアイテムを取得
-        items_in_range = Item.objects.filter(
-            expires_on__lte=target_date,
-            expires_on__gte=today,
-            status='using'
-        ).select_related('user')
-        
-        created_count = 0
-        for item in items_in_range:
-            # 重複チェック: 同じユーザー・アイテム・タイプの通知が既に存在するか
-            existing = Notification.objects.filter(
-                user=item.user,
-                item=item,
-                type=notification_type
-            ).exists()
-            
-            if not existing:
-                days_until_expiry = (item.expires_on - today).days
-                Notification.objects.create(
-                    user=item.user,
-                    item=item,
-                    type=notification_type,
-                    title=title,
-                    body=f'{item.name}の使用期限が{days_until_expiry}日後です（期限: {item.expires_on}）',
-                    scheduled_for=timezone.now()
-                )
-                created_count += 1
-        
-        return created_count
\ No newline at end of file
+    def _target_timezones(self, now, hourly, blocks):
+        """
+        処理するタイムゾーンを返す
+        - 通常: 利用中のタイムゾーンすべて（既定のタイムゾーンは常に含む）
+        - 毎時: 担当ブロックのどれかで、現地の今日の分がまだ処理されていないタイムゾーンのみ
+          （0時台に限らないので、実行が抜けたり遅れたりしても次の回で処理される）
+        """
+        timezones = {UserProfile.DEFAULT_TIMEZONE}
+        timezones.update(UserProfile.objects.values_list('timezone', flat=True).distinct())
+        if hourly:
+            keys = {f'{block_key(*block)}:{tz}': tz for tz in timezones for block in blocks}
+            last_run = dict(
+                NotificationWatermark.objects.filter(key__in=keys).values_list('key', 'last_run_on')
+            )
+            timezones = {
+                tz for key, tz in keys.items()
+                if last_run.get(key) is None or last_run[key] < now.astimezone(zoneinfo.ZoneInfo(tz)).date()
+            }
+        return sorted(timezones)
+
+    def _timezone_scope(self, tz_name):
+        """指定タイムゾーンのユーザーのアイテムに絞る条件"""
+        return UserProfile.timezone_q(tz_name)
+
+    def _scope(self, today, watermark):
+        """
+        処理対象アイテムの条件を返す
+        - フルスキャン: 使用中、または次回通知日が残っているアイテムすべて
+        - 差分: 次回通知日が到来したもの + 前回以降に更新されたもの + 前回以降に D30/D14/D7 の境界をまたいだもの
+        """
+        if watermark is None:
+            self.stdout.write('フルスキャンで実行します')
+            return Q(status='using') | Q(next_alert_on__isnull=False)
+
+        self.stdout.write(
+            f'差分実行: 前回 {watermark.last_run_on} / 更新基準 {watermark.last_item_updated_at}'
+        )
+        scope = Q(next_alert_on__lte=today)
+        if watermark.last_item_updated_at:
+            scope |= Q(updated_at__gt=watermark.last_item_updated_at)
+        for _, days in Item.ALERT_THRESHOLDS:
+            # 期限 - days が (前回実行日, 今日] に入った使用中アイテム（部分インデックスで引く）
+            scope |= Q(
+                status='using',
+                expires_on__gt=watermark.last_run_on + timedelta(days=days),
+                expires_on__lte=today + timedelta(days=days),
+            )
+        return scope
+
+    def _user_blocks(self, shards, shard_index):
+        """
+        担当シャードのユーザーIDブロック [lo, hi) の一覧
+        ブロックは USER_BLOCK_SIZE 刻みの固定の区切りで、k 番目のブロックを k % shards のシャードが担当する
+        """
+        bounds = get_user_model().objects.aggregate(lo=Min('id'), hi=Max('id'))
+        if bounds['lo'] is None:
+            return []
+
+        first, last = bounds['lo'] // USER_BLOCK_SIZE, bounds['hi'] // USER_BLOCK_SIZE
+        return [
+            (k * USER_BLOCK_SIZE, (k + 1) * USER_BLOCK_SIZE)
+            for k in range(first, last + 1)
+            if k % shards == shard_index
+        ]
+
+    def _run_ranges(self, range_ids, workers, today, include_expired, batch_size, digest):
+        """各範囲（lo, hi, アイテムID一覧）を順番に、またはプロセスプールで並列に処理し、完了した順に結果を返す"""
+        if workers > 1 and len(range_ids) > 1:
+            if 'fork' in multiprocessing.get_all_start_methods():
+                # 子プロセスに親の DB 接続を引き継がせない
+                connections.close_all()
+                with ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context('fork')
+                ) as pool:
+                    pending = {
+                        pool.submit(run_user_range, lo, hi, item_ids, today, include_expired, batch_size, digest)
+                        for lo, hi, item_ids in range_ids
+                    }
+                    # 待機中も定期的にハートビートを送る
+                    while pending:
+                        done, pending = wait(pending, timeout=self.lease_ttl / 3, return_when=FIRST_COMPLETED)
+                        self._heartbeat()
+                        for future in done:
+                            yield future.result()
+                return
+            self.stdout.write(self.style.WARNING('この環境では fork が使えないため順番に処理します。'))
+
+        for lo, hi, item_ids in range_ids:
+            result = run_user_range(lo, hi, item_ids, today, include_expired, batch_size, digest)
+            self._heartbeat()
+            yield result
+
+    def _heartbeat(self):
+        """担当ブロックのリースを延長する。1つでも他の実行に引き継がれていたら中断する"""
+        if not CommandLease.heartbeat_many(self.lease_names, self.lease_owner, self.lease_ttl):
+            raise CommandError('リースを失ったため中断します（他のプロセスが引き継ぎました）。')
+
+
+def passed_monday(last_run_on, today):
+    """今日が月曜日か、前回実行日の翌日から今日までに月曜日があるか（直近の月曜日は今日の weekday() 日前）"""
+    return today.weekday() == 0 or (last_run_on is not None and today.weekday() < (today - last_run_on).days)
+
+
+def block_key(lo, hi):
+    """ユーザーIDブロックのリース名（ウォーターマークのキーの接頭辞にも使う）"""
+    return f'generate_notifications:users:{lo}-{hi}'
+
+
+def due_item_ids(today, scope=None, blocks=None, full=False):
+    """
+    対象アイテム（既定は next_alert_on <= today）の (id, user_id) 一覧
+    blocks を渡すと担当するユーザーIDブロック [lo, hi) のアイテムだけに絞る
+    - 並び順は付けない。付けると SQLite が id の索引を選び、対象外も含めて全アイテムを読むため
+    - 差分（既定）: ブロックの条件は user_id + 0 で書き、ユーザーの索引を選ばせない。
+      条件の各項は next_alert_on / updated_at / expires_on の索引で引き、ブロックは読んだ行で絞る
+      （next_alert_on は (next_alert_on, user) 索引の中だけで絞れる）
+    - full=True（フルスキャンの条件）: 担当ブロックのアイテムをすべて読むため、ユーザーの索引で範囲検索する
+    """
+    due = Item.objects.filter(scope if scope is not None else Q(next_alert_on__lte=today))
+    if blocks:
+        if not full:
+            due = due.alias(block_user=F('user_id') + 0)
+        field = 'user_id' if full else 'block_user'
+        block_scope = Q()
+        for lo, hi in blocks:
+            block_scope |= Q(**{f'{field}__gte': lo, f'{field}__lt': hi})
+        due = due.filter(block_scope)
+    return list(due.order_by().values_list('id', 'user_id'))
+
+
+def assign_ranges(ranges, due):
+    """(id, user_id) 一覧をユーザーID範囲 [lo, hi) ごとに振り分け、対象のある範囲だけを (lo, hi, id一覧) で返す"""
+    starts = [lo for lo, _ in ranges]
+    assigned = [[] for _ in ranges]
+    for item_id, user_id in due:
+        index = bisect_right(starts, user_id) - 1
+        if index >= 0 and user_id < ranges[index][1]:
+            assigned[index].append(item_id)
+    return [(lo, hi, sorted(ids)) for (lo, hi), ids in zip(ranges, assigned) if ids]
+
+
+def run_user_range(lo, hi, item_ids, today, include_expired, batch_size, digest=False):
+    """ユーザーID範囲 [lo, hi) の対象アイテムの通知を1つの短いトランザクションで生成する（ワーカープロセスからも呼ばれる）"""
+    started = time.monotonic()
+    with transaction.atomic():
+        counts = generate_due_notifications(today, include_expired, batch_size, item_ids, digest=digest)
+    return lo, hi, counts, time.monotonic() - started
+
+
+def generate_due_notifications(today, include_expired, batch_size, item_ids=None, digest=False):
+    """
+    対象アイテム（既定は due_item_ids で引いた next_alert_on <= today のもの）について期限が来た通知を一括生成する
+    - digest=False: アイテムごとに1件
+    - digest=True: (ユーザー, 種別, 日付) ごとに1件へまとめ、既存のダイジェストには追記する
+    - どちらのモードでも、今日のアイテム単位の通知・ダイジェストに既に含まれるアイテムには送らない
+    処理したアイテムは送信済みフラグと次回通知日を書き戻し、ユーザーごとの未読数を加算する
+    件数は新たに通知の対象になったアイテム数で数える（同じ日の通知が既にあるものは数えない）
+    """
+    created_counts = {key: 0 for key, _ in NOTIFICATION_SPECS.values()}
+    now = timezone.now()
+    if item_ids is None:
+        item_ids = sorted(item_id for item_id, _ in due_item_ids(today))
+
+    # 先に引いた id を batch_size ずつ主キーで読む（更新中のカーソルを開いたままにしない）
+    for start in range(0, len(item_ids), batch_size):
+        rows = list(due_items(item_ids[start:start + batch_size], today))
+
+        # 今日の通知はモードによらず両方の形を確認する（同じ日に --digest とアイテム単位の実行が混ざっても二重に送らない）
+        digests = _existing_digests(rows, today)
+        # 今日のアイテム単位の通知が既にある (item_id, type)。一意制約で挿入されない分を未読数に数えない
+        existing = _existing_item_notifications(rows, today)
+        notifications = []
+        grouped = {}
+        increments = {}
+        items = []
+        for row in rows:
+            # 期限前通知は1回限りなのでフラグで、期限切れ通知は当日分の有無で判定する
+            sent_types = Item.decode_alert_flags(row['alert_sent_flags'])
+            if (row['id'], 'OVERWEEK') in existing:
+                sent_types.add('OVERWEEK')
+            overweek_digest = digests.get((row['user_id'], 'OVERWEEK'))
+            if overweek_digest and row['id'] in overweek_digest.item_ids:
+                sent_types.add('OVERWEEK')
+
+            for notification_type in _due_types(row, today, include_expired, sent_types):
+                sent_types.add(notification_type)
+                if digest:
+                    grouped.setdefault((row['user_id'], notification_type), []).append(row['id'])
+                    continue
+                if (row['id'], notification_type) in existing:
+                    continue
+                notifications.append(_build_notification(row, notification_type, today, now))
+                created_counts[NOTIFICATION_SPECS[notification_type][0]] += 1
+                by_type = increments.setdefault(row['user_id'], {})
+                by_type[notification_type] = by_type.get(notification_type, 0) + 1
+
+            item = Item(id=row['id'], status=row['status'], expires_on=row['expires_on'])
+            item.alert_sent_flags = Item.encode_alert_flags(sent_types)
+            item.next_alert_on, item.next_alert_type = item.compute_next_alert(today, sent_types)
+            items.append(item)
+
+        if digest:
+            notifications, added, increments = _merge_digests(grouped, digests, today, now, batch_size)
+            for notification_type, count in added.items():
+                created_counts[NOTIFICATION_SPECS[notification_type][0]] += count
+
+        # 一意制約 (item, type, scheduled_on) / (user, type, scheduled_on) に当たる行は DB 側で無視される
+        Notification.objects.bulk_create(notifications, batch_size=batch_size, ignore_conflicts=True)
+        Item.objects.bulk_update(
+            items, ['alert_sent_flags', 'next_alert_on', 'next_alert_type'], batch_size=batch_size
+        )
+        NotificationCounter.add(increments)
+
+    return created_counts
+
+
+def due_items(item_ids, today):
+    """指定アイテムの通知判定に使う values クエリ（id 順、主キーで引く）"""
+    return (
+        Item.objects.filter(id__in=item_ids)
+        .values('id', 'user_id', 'name', 'status', 'expires_on', 'alert_sent_flags')
+        .order_by('id')
+    )
+
+
+def _existing_item_notifications(rows, today):
+    """バッチ内アイテムの今日のアイテム単位の通知を (item_id, type) の集合で返す（一意制約の索引で引く）"""
+    return set(
+        Notification.objects.filter(item_id__in=[row['id'] for row in rows], scheduled_on=today)
+        .order_by().values_list('item_id', 'type')
+    )
+
+
+def _existing_digests(rows, today):
+    """バッチ内ユーザーの今日のダイジェストを (user_id, type) -> Notification で返す"""
+    user_ids = {row['user_id'] for row in rows}
+    return {
+        (n.user_id, n.type): n
+        for n in Notification.objects.filter(
+            user_id__in=user_ids, item__isnull=True, scheduled_on=today
+        ).only('id', 'user_id', 'type', 'item_ids', 'item_count', 'scheduled_for')
+    }
+
+
+def _merge_digests(grouped, digests, today, now, batch_size):
+    """
+    (user_id, type) -> アイテムID一覧 を既存のダイジェストへ追記し、無いものは新規作成用の行を返す
+    追記したダイジェストは通知予定時刻を進めて既読位置より後ろ（＝未読）に戻す
+    戻り値: (新規作成する通知, 種別 -> 新たに加わったアイテム数, 未読数の増分 user_id -> {種別: 件数})
+    未読数は既読だったダイジェストが未読に戻る分（追記後の全件）も含める
+    """
+    notifications = []
+    merged = []
+    added = {}
+    increments = {}
+
+    def count(user_id, notification_type, new_items, unread_items):
+        added[notification_type] = added.get(notification_type, 0) + new_items
+        by_type = increments.setdefault(user_id, {})
+        by_type[notification_type] = by_type.get(notification_type, 0) + unread_items
+
+    # 追記先のダイジェストが既読位置より前（＝既読）かを判定する
+    read_marks = {}
+    if digests:
+        read_marks = {
+            (user_id, notification_type): read_through
+            for user_id, notification_type, read_through in NotificationReadMark.objects.filter(
+                user_id__in={user_id for user_id, _ in digests}
+            ).values_list('user_id', 'type', 'read_through')
+        }
+
+    for (user_id, notification_type), item_ids in grouped.items():
+        existing = digests.get((user_id, notification_type))
+        if existing is None:
+            notifications.append(Notification(
+                user_id=user_id,
+                item=None,
+                type=notification_type,
+                title=NOTIFICATION_SPECS[notification_type][1],
+                body='',
+                item_ids=item_ids,
+                item_count=len(item_ids),
+                scheduled_for=now,
+                scheduled_on=today,
+            ))
+            count(user_id, notification_type, len(item_ids), len(item_ids))
+            continue
+        already = set(existing.item_ids)
+        new_ids = [i for i in item_ids if i not in already]
+        if not new_ids:
+            continue
+        read_through = read_marks.get((user_id, notification_type))
+        was_read = read_through is not None and existing.scheduled_for <= read_through
+        # 既読だったダイジェストは追記後の全件が未読に戻る
+        unread = len(existing.item_ids) + len(new_ids) if was_read else len(new_ids)
+        count(user_id, notification_type, len(new_ids), unread)
+        existing.item_ids = existing.item_ids + new_ids
+        existing.item_count = len(existing.item_ids)
+        existing.scheduled_for = now
+        existing.updated_at = now
+        merged.append(existing)
+
+    Notification.objects.bulk_update(
+        merged, ['item_ids', 'item_count', 'scheduled_for', 'updated_at'], batch_size=batch_size
+    )
+    return notifications, added, increments
+
+
+def _due_types(row, today, include_expired, sent_types):
+    """このアイテムについて今日生成すべき通知種別を返す"""
+    if row['status'] != 'using':
+        return []
+
+    expires_on = row['expires_on']
+    due_types = []
+    # 期限切れ通知（週次）
+    if include_expired and expires_on < today and 'OVERWEEK' not in sent_types:
+        due_types.append('OVERWEEK')
+    # 期限がN日以内（当日含む）の通知（1回のみ）
+    for notification_type, days in Item.ALERT_THRESHOLDS:
+        if notification_type not in sent_types and today <= expires_on <= today + timedelta(days=days):
+            due_types.append(notification_type)
+    return due_types
+
+
+def _build_notification(row, notification_type, today, now):
+    """アイテム単位の通知オブジェクトを組み立てる"""
+    return Notification(
+        user_id=row['user_id'],
+        item_id=row['id'],
+        type=notification_type,
+        title=NOTIFICATION_SPECS[notification_type][1],
+        body=Notification.format_body(notification_type, row['name'], row['expires_on'], today),
+        scheduled_for=now,
+        scheduled_on=today,
+    )
@@ -0,0 +1,172 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+import csv
+import json
+import time
+from beauty import taxonomy
+from beauty.models import Taxon, TaxonClosure
+from beauty.management.commands.export_taxonomy import FORMATS, PATH_SEPARATOR, parse_path
+
+
+# 1文で INSERT / UPDATE する件数
+DEFAULT_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'JSON または CSV からカテゴリ木を一括登録します'
+        '（パスが既にあるカテゴリは期限ルールを更新、途中の階層が無ければ作成）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='読み込むファイル（export_taxonomy の出力形式）')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='入力形式（省略時はファイルの拡張子）',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'1文で処理する件数（デフォルト: {DEFAULT_BATCH_SIZE}）',
+        )
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or options['path'].rsplit('.', 1)[-1].lower()
+        if fmt not in FORMATS:
+            raise CommandError(f'形式を判定できません。--format を指定してください: {options["path"]}')
+        batch_size = max(1, options['batch_size'])
+
+        records = self._read(options['path'], fmt)
+        started = time.monotonic()
+
+        # パスごとの期限ルール（途中の階層は None = 既定値で作成・既存なら変更しない）
+        wanted = {}
+        for path, rule in records:
+            for i in range(1, len(path)):
+                wanted.setdefault(path[:i], None)
+            wanted[path] = rule
+
+        with transaction.atomic():
+            now = timezone.now()
+            ids, rules = self._existing_paths()
+
+            # 親から順に、階層ごとにまとめて作成する（作成した行の id を次の階層の親に使う）
+            created_paths = []
+            for depth in sorted({len(path) for path in wanted}):
+                level = [path for path in wanted if len(path) == depth and path not in ids]
+                new_taxa = []
+                for path in level:
+                    taxon = Taxon(
+                        name=path[-1],
+                        parent_id=ids[path[:-1]] if depth > 1 else None,
+                        depth=depth - 1,
+                        full_path=PATH_SEPARATOR.join(path),
+                    )
+                    if wanted[path]:
+                        taxon.shelf_life_months, taxon.shelf_life_anchor = wanted[path]
+                    new_taxa.append(taxon)
+                Taxon.objects.bulk_create(new_taxa, batch_size=batch_size)
+                for path, taxon in zip(level, new_taxa):
+                    ids[path] = taxon.pk
+                created_paths += level
+
+            # 祖先・子孫テーブル（自分自身と祖先すべての組）
+            TaxonClosure.objects.bulk_create(
+                [
+                    TaxonClosure(ancestor_id=ids[path[:i]], descendant_id=ids[path], depth=len(path) - i)
+                    for path in created_paths
+                    for i in range(1, len(path) + 1)
+                ],
+                batch_size=batch_size,
+            )
+
+            # 子を持つようになった既存カテゴリは葉でなくなる
+            parent_ids = sorted({ids[path[:-1]] for path in created_paths if len(path) > 1})
+            for i in range(0, len(parent_ids), batch_size):
+                Taxon.objects.filter(id__in=parent_ids[i:i + batch_size], is_leaf=True).update(
+                    is_leaf=False, updated_at=now,
+                )
+
+            # 既存カテゴリの期限ルール
+            changed = [
+                Taxon(id=ids[path], shelf_life_months=rule[0], shelf_life_anchor=rule[1], updated_at=now)
+                for path, rule in wanted.items()
+                if rule and path in rules and rules[path] != rule
+            ]
+            Taxon.objects.bulk_update(
+                changed, ['shelf_life_months', 'shelf_life_anchor', 'updated_at'], batch_size=batch_size
+            )
+
+            # bulk 操作はシグナルを送らないため、スナップショットはここで無効化する
+            # （updated_at も進めてあるので、キャッシュを共有しない他プロセスも最終更新日時で気づく）
+            transaction.on_commit(taxonomy.invalidate)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'カテゴリを読み込みました: {len(records)}行（新規{len(created_paths)}件, '
+                f'期限ルール更新{len(changed)}件, {time.monotonic() - started:.2f}秒）'
+            )
+        )
+
+    def _existing_paths(self):
+        """既存カテゴリの {名前の列: id} と {名前の列: (期限月数, 基準日)}"""
+        taxa = {
+            t[0]: t for t in Taxon.objects.values_list(
+                'id', 'name', 'parent_id', 'shelf_life_months', 'shelf_life_anchor'
+            )
+        }
+        ids, rules = {}, {}
+        for taxon in taxa.values():
+            names = []
+            node = taxon
+            while node is not None:
+                names.append(node[1])
+                node = taxa.get(node[2])
+            path = tuple(reversed(names))
+            ids[path] = taxon[0]
+            rules[path] = (taxon[3], taxon[4])
+        return ids, rules
+
+    def _read(self, filename, fmt):
+        """(名前のタプル, (期限月数, 基準日) または None) のリスト"""
+        try:
+            with open(filename, encoding='utf-8-sig', newline='') as f:
+                if fmt == 'json':
+                    rows = json.load(f)
+                else:
+                    rows = list(csv.DictReader(f))
+        except (OSError, ValueError) as e:
+            raise CommandError(f'読み込めません: {e}')
+        if not isinstance(rows, list):
+            raise CommandError('JSON はオブジェクトの配列にしてください。')
+
+        anchors = {value for value, _ in Taxon.SHELF_LIFE_ANCHOR_CHOICES}
+        records = []
+        for line, row in enumerate(rows, start=1):
+            path = row.get('path') if isinstance(row, dict) else None
+            if isinstance(path, str):
+                path = parse_path(path)
+            if not path:
+                raise CommandError(f'{line}件目: path がありません。')
+            path = tuple(str(name).strip() for name in path)
+            if not all(path):
+                raise CommandError(f'{line}件目: 空のカテゴリ名があります: {row.get("path")}')
+
+            months = row.get('shelf_life_months')
+            anchor = row.get('shelf_life_anchor') or 'end_of_month'
+            rule = None
+            if months not in (None, ''):
+                try:
+                    months = int(months)
+                except (TypeError, ValueError):
+                    months = -1
+                if months < 0:
+                    raise CommandError(f'{line}件目: shelf_life_months が不正です: {row.get("shelf_life_months")}')
+                if anchor not in anchors:
+                    raise CommandError(f'{line}件目: shelf_life_anchor が不正です: {anchor}')
+                rule = (months, anchor)
+            records.append((path, rule))
+        return records
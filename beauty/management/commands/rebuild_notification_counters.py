@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import transaction
+import time
+from beauty.models import NotificationCounter
+
+
+# 1トランザクションで作り直すユーザー数
+DEFAULT_BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'ユーザーごとの未読通知数を通知テーブルから作り直します（ずれの修正用）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='対象ユーザーID（複数指定可、省略時は全ユーザー）',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'1トランザクションで処理するユーザー数（デフォルト: {DEFAULT_BATCH_SIZE}）',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        users = get_user_model().objects.order_by('id')
+        if options['user_ids']:
+            users = users.filter(id__in=options['user_ids'])
+        user_ids = list(users.values_list('id', flat=True))
+
+        started = time.monotonic()
+        created = 0
+        fixed = 0
+        for i in range(0, len(user_ids), batch_size):
+            chunk = user_ids[i:i + batch_size]
+            # 集計と書き戻しの間に通知生成・既読化が入らないよう同じトランザクションで行う
+            with transaction.atomic():
+                computed = NotificationCounter.compute(chunk)
+                current = {
+                    c.user_id: c for c in NotificationCounter.objects.filter(user_id__in=chunk)
+                }
+                for user_id, counter in computed.items():
+                    old = current.get(user_id)
+                    if old is None:
+                        created += 1
+                    elif old.buckets() != counter.buckets():
+                        fixed += 1
+                    counter.version = old.version + 1 if old else 0
+                NotificationCounter.objects.bulk_create(
+                    computed.values(),
+                    update_conflicts=True,
+                    unique_fields=['user'],
+                    update_fields=['expired', 'week', 'biweek', 'month', 'total', 'version', 'updated_at'],
+                )
+                NotificationCounter.signal_changed(chunk)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'未読通知数を作り直しました: {len(user_ids)}ユーザー（新規{created}件, 修正{fixed}件, '
+                f'{time.monotonic() - started:.2f}秒）'
+            )
+        )
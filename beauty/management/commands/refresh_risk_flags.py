@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from datetime import timedelta
+import time
+import zoneinfo
+from beauty.expiry import EXPIRY_BUCKETS, bucket_q
+from beauty.models import Item, UserProfile
+
+
+# 1トランザクションで更新する件数
+DEFAULT_BATCH_SIZE = 1000
+
+# 期限切れに移った行を探す日数（実行が空いた日数までは取りこぼさない）
+DEFAULT_LOOKBACK_DAYS = 7
+
+# 日付が進むと区分は 余裕あり → 30日以内 → 14日以内 → 7日以内 → 期限切れ の向きにだけ移るため、
+# 移り先になりうる区分だけを見る（余裕ありへは編集でしか移らず、save で計算済み）
+TRANSITION_BUCKETS = ('expired', 'week', 'biweek', 'month')
+
+
+def stale_rows(bucket, today, scope, lookback_days=DEFAULT_LOOKBACK_DAYS):
+    """
+    今日の区分が bucket なのに保存済みの区分が違う行（期限日の範囲検索）
+    - 7日/14日/30日以内は区分の期限日の範囲全体（最大16日分）
+    - 期限切れは直近 lookback_days 日分だけ（None なら期限切れ全体）
+    """
+    condition = bucket_q(bucket, today)
+    if bucket == 'expired' and lookback_days is not None:
+        condition &= Q(expires_on__gte=today - timedelta(days=lookback_days))
+    return Item.objects.filter(condition & scope).exclude(risk_flag=bucket).order_by()
+
+
+class Command(BaseCommand):
+    help = (
+        'アイテムの期限区分（risk_flag）を各ユーザーのタイムゾーンの今日の日付で更新します。'
+        '境界をまたいだ期限日の範囲だけを読むので、毎時実行して各タイムゾーンの0時過ぎに反映させてください。'
+        '実行が --lookback-days 日以上止まった後や DB を復元した後は --full で全件を計算し直してください'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'1トランザクションで更新する件数（デフォルト: {DEFAULT_BATCH_SIZE}）',
+        )
+        parser.add_argument(
+            '--lookback-days',
+            type=int,
+            default=DEFAULT_LOOKBACK_DAYS,
+            help=f'期限切れに移った行を探す日数（デフォルト: {DEFAULT_LOOKBACK_DAYS}）',
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='すべての区分・期限日について計算し直す（保存済みの区分と違う行だけを更新する）',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        full = options['full']
+        lookback_days = None if full else max(1, options['lookback_days'])
+        buckets = EXPIRY_BUCKETS if full else TRANSITION_BUCKETS
+        started = time.monotonic()
+
+        timezones = {UserProfile.DEFAULT_TIMEZONE}
+        timezones.update(UserProfile.objects.values_list('timezone', flat=True).distinct())
+
+        updated = 0
+        for tz_name in sorted(timezones):
+            today = timezone.localdate(timezone=zoneinfo.ZoneInfo(tz_name))
+            scope = UserProfile.timezone_q(tz_name)
+            for bucket in buckets:
+                stale = stale_rows(bucket, today, scope, lookback_days)
+                while True:
+                    with transaction.atomic():
+                        ids = list(stale.values_list('id', flat=True)[:batch_size])
+                        if not ids:
+                            break
+                        Item.objects.filter(id__in=ids).update(risk_flag=bucket)
+                    updated += len(ids)
+            self.stdout.write(f"  {tz_name}: {today} 時点{'（全件）' if full else ''}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'期限区分を更新しました: {updated}件'
+                f'（{len(timezones)}タイムゾーン, {time.monotonic() - started:.2f}秒）'
+            )
+        )
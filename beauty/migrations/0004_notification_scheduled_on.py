@@ -0,0 +1,52 @@
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_scheduled_on(apps, schema_editor):
+    """既存通知の scheduled_on を埋め、同一 (item, type, 日付) の重複を削除する"""
+    Notification = apps.get_model('beauty', 'Notification')
+
+    seen = set()
+    duplicate_ids = []
+    to_update = []
+    for n in Notification.objects.order_by('id').only('id', 'item_id', 'type', 'scheduled_for').iterator(chunk_size=2000):
+        n.scheduled_on = timezone.localdate(n.scheduled_for)
+        key = (n.item_id, n.type, n.scheduled_on)
+        if key in seen:
+            duplicate_ids.append(n.id)
+            continue
+        seen.add(key)
+        to_update.append(n)
+        if len(to_update) >= 1000:
+            Notification.objects.bulk_update(to_update, ['scheduled_on'])
+            to_update = []
+    if to_update:
+        Notification.objects.bulk_update(to_update, ['scheduled_on'])
+
+    for i in range(0, len(duplicate_ids), 500):
+        Notification.objects.filter(id__in=duplicate_ids[i:i + 500]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beauty', '0003_taxon_shelf_life_anchor_taxon_shelf_life_months'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='scheduled_on',
+            field=models.DateField(null=True, verbose_name='通知予定日'),
+        ),
+        migrations.RunPython(fill_scheduled_on, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='notification',
+            name='scheduled_on',
+            field=models.DateField(verbose_name='通知予定日'),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(fields=('item', 'type', 'scheduled_on'), name='uniq_notification_item_type_date'),
+        ),
+    ]
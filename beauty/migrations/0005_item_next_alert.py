@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def fill_next_alert_on(apps, schema_editor):
+    """使用中アイテムの次回通知日を「期限30日前」で初期化する（初回実行時に正確な値へ再計算される）"""
+    Item = apps.get_model('beauty', 'Item')
+
+    batch = []
+    for item in Item.objects.filter(status='using').only('id', 'expires_on').iterator(chunk_size=2000):
+        item.next_alert_on = item.expires_on - timedelta(days=30)
+        item.next_alert_type = 'D30'
+        batch.append(item)
+        if len(batch) >= 1000:
+            Item.objects.bulk_update(batch, ['next_alert_on', 'next_alert_type'])
+            batch = []
+    if batch:
+        Item.objects.bulk_update(batch, ['next_alert_on', 'next_alert_type'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beauty', '0004_notification_scheduled_on'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='next_alert_on',
+            field=models.DateField(blank=True, db_index=True, null=True, verbose_name='次回通知日'),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='next_alert_type',
+            field=models.CharField(blank=True, max_length=10, verbose_name='次回通知種別'),
+        ),
+        migrations.RunPython(fill_next_alert_on, migrations.RunPython.noop),
+    ]
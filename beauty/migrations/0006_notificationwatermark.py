@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beauty', '0005_item_next_alert'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True, verbose_name='キー')),
+                ('last_run_on', models.DateField(verbose_name='前回実行日')),
+                ('last_item_updated_at', models.DateTimeField(blank=True, null=True, verbose_name='処理済みアイテム更新日時')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+            ],
+            options={
+                'verbose_name': '通知生成ウォーターマーク',
+                'verbose_name_plural': '通知生成ウォーターマーク',
+            },
+        ),
+    ]
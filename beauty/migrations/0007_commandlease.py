@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beauty', '0006_notificationwatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommandLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='リース名')),
+                ('owner', models.CharField(max_length=200, verbose_name='保持者')),
+                ('acquired_at', models.DateTimeField(verbose_name='取得日時')),
+                ('heartbeat_at', models.DateTimeField(verbose_name='最終ハートビート')),
+                ('expires_at', models.DateTimeField(verbose_name='有効期限')),
+            ],
+            options={
+                'verbose_name': 'コマンドリース',
+                'verbose_name_plural': 'コマンドリース',
+            },
+        ),
+    ]
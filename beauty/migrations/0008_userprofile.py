@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beauty', '0007_commandlease'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timezone', models.CharField(choices=[('Asia/Tokyo', '日本 (Asia/Tokyo)'), ('Asia/Seoul', '韓国 (Asia/Seoul)'), ('Asia/Shanghai', '中国 (Asia/Shanghai)'), ('Asia/Taipei', '台湾 (Asia/Taipei)'), ('Asia/Singapore', 'シンガポール (Asia/Singapore)'), ('Asia/Bangkok', 'タイ (Asia/Bangkok)'), ('Asia/Kolkata', 'インド (Asia/Kolkata)'), ('Australia/Sydney', 'オーストラリア東部 (Australia/Sydney)'), ('Pacific/Auckland', 'ニュージーランド (Pacific/Auckland)'), ('Europe/London', 'イギリス (Europe/London)'), ('Europe/Paris', '中央ヨーロッパ (Europe/Paris)'), ('America/New_York', 'アメリカ東部 (America/New_York)'), ('America/Chicago', 'アメリカ中部 (America/Chicago)'), ('America/Denver', 'アメリカ山岳部 (America/Denver)'), ('America/Los_Angeles', 'アメリカ西部 (America/Los_Angeles)'), ('Pacific/Honolulu', 'ハワイ (Pacific/Honolulu)'), ('UTC', '協定世界時 (UTC)')], default='Asia/Tokyo', max_length=64, verbose_name='タイムゾーン')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': 'ユーザー設定',
+                'verbose_name_plural': 'ユーザー設定',
+                'indexes': [models.Index(fields=['timezone', 'user'], name='beauty_profile_tz_user_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Item.ALERT_FLAGS と同じ割り当て
+ALERT_FLAGS = {'D30': 1, 'D14': 2, 'D7': 4}
+
+
+def fill_alert_sent_flags(apps, schema_editor):
+    """既存のアイテム単位通知から送信済みフラグを復元する"""
+    Item = apps.get_model('beauty', 'Item')
+    Notification = apps.get_model('beauty', 'Notification')
+
+    flags = {}
+    rows = (
+        Notification.objects
+        .filter(type__in=list(ALERT_FLAGS), item__isnull=False)
+        .values_list('item_id', 'type')
+        .distinct()
+    )
+    for item_id, notification_type in rows.iterator(chunk_size=2000):
+        flags[item_id] = flags.get(item_id, 0) | ALERT_FLAGS[notification_type]
+
+    batch = []
+    for item_id, value in flags.items():
+        batch.append(Item(id=item_id, alert_sent_flags=value))
+        if len(batch) >= 1000:
+            Item.objects.bulk_update(batch, ['alert_sent_flags'])
+            batch = []
+    if batch:
+        Item.objects.bulk_update(batch, ['alert_sent_flags'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beauty', '0008_userprofile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='alert_sent_flags',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='送信済み通知フラグ'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='item_count',
+            field=models.PositiveIntegerField(default=1, verbose_name='対象アイテム数'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='item_ids',
+            field=models.JSONField(blank=True, default=list, verbose_name='対象アイテムID'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='body',
+            field=models.TextField(blank=True, verbose_name='通知本文'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='item',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='beauty.item'),
+        ),
+        migrations.RunPython(fill_alert_sent_flags, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('item__isnull', True)), fields=('user', 'type', 'scheduled_on'), name='uniq_notification_digest_user_type_date'),
+        ),
+    ]
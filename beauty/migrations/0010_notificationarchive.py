@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beauty', '0009_notification_digest'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True, verbose_name='元の通知ID')),
+                ('item_ref_id', models.BigIntegerField(blank=True, null=True, verbose_name='アイテムID')),
+                ('type', models.CharField(choices=[('D30', '30日前'), ('D14', '14日前'), ('D7', '7日前'), ('OVERWEEK', '期限切れ')], max_length=10, verbose_name='通知種別')),
+                ('title', models.CharField(max_length=200, verbose_name='通知タイトル')),
+                ('body', models.TextField(blank=True, verbose_name='通知本文')),
+                ('item_ids', models.JSONField(blank=True, default=list, verbose_name='対象アイテムID')),
+                ('item_count', models.PositiveIntegerField(default=1, verbose_name='対象アイテム数')),
+                ('scheduled_for', models.DateTimeField(verbose_name='通知予定時刻')),
+                ('scheduled_on', models.DateField(verbose_name='通知予定日')),
+                ('read_at', models.DateTimeField(blank=True, null=True, verbose_name='既読時刻')),
+                ('created_at', models.DateTimeField(verbose_name='作成日時')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='アーカイブ日時')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': '通知アーカイブ',
+                'verbose_name_plural': '通知アーカイブ',
+                'ordering': ['-scheduled_for'],
+            },
+        ),
+    ]
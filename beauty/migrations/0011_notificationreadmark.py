@@ -0,0 +1,81 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, Min
+from django.utils import timezone
+
+
+def fill_read_marks(apps, schema_editor):
+    """
+    read_at から (user, type) ごとの既読位置を作る
+    既読位置は「最初の未読通知より前にある既読通知」の最大の通知予定時刻
+    （未読より後ろにある既読通知は未読に戻る）
+    """
+    Notification = apps.get_model('beauty', 'Notification')
+    NotificationReadMark = apps.get_model('beauty', 'NotificationReadMark')
+
+    first_unread = {
+        (row['user_id'], row['type']): row['first']
+        for row in Notification.objects.filter(read_at__isnull=True)
+        .values('user_id', 'type').annotate(first=Min('scheduled_for'))
+    }
+
+    marks = []
+    read = Notification.objects.filter(read_at__isnull=False)
+    for row in read.values('user_id', 'type').annotate(last=Max('scheduled_for')).iterator():
+        key = (row['user_id'], row['type'])
+        read_through = row['last']
+        if key in first_unread and read_through >= first_unread[key]:
+            read_through = (
+                read.filter(user_id=key[0], type=key[1], scheduled_for__lt=first_unread[key])
+                .aggregate(v=Max('scheduled_for'))['v']
+            )
+        if read_through:
+            marks.append(NotificationReadMark(
+                user_id=key[0], type=key[1], read_through=read_through, updated_at=timezone.now()
+            ))
+    NotificationReadMark.objects.bulk_create(marks, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beauty', '0010_notificationarchive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationReadMark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('D30', '30日前'), ('D14', '14日前'), ('D7', '7日前'), ('OVERWEEK', '期限切れ')], max_length=10, verbose_name='通知種別')),
+                ('read_through', models.DateTimeField(verbose_name='既読位置')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+            ],
+            options={
+                'verbose_name': '通知既読位置',
+                'verbose_name_plural': '通知既読位置',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'type', 'scheduled_for'], name='beauty_notif_user_type_sf_idx'),
+        ),
+        migrations.AddField(
+            model_name='notificationreadmark',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_read_marks', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='notificationreadmark',
+            constraint=models.UniqueConstraint(fields=('user', 'type'), name='uniq_notification_read_mark_user_type'),
+        ),
+        migrations.RunPython(fill_read_marks, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='notification',
+            name='read_at',
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('beauty', '0011_notificationreadmark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('expired', models.PositiveIntegerField(default=0, verbose_name='期限切れ')),
+                ('week', models.PositiveIntegerField(default=0, verbose_name='7日以内')),
+                ('biweek', models.PositiveIntegerField(default=0, verbose_name='14日以内')),
+                ('month', models.PositiveIntegerField(default=0, verbose_name='30日以内')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='合計')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='バージョン')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+            ],
+            options={
+                'verbose_name': '未読通知数',
+                'verbose_name_plural': '未読通知数',
+            },
+        ),
+    ]
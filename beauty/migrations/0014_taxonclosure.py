@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_closure(apps, schema_editor):
+    """既存のカテゴリ木から祖先・子孫の組をすべて作る"""
+    Taxon = apps.get_model('beauty', 'Taxon')
+    TaxonClosure = apps.get_model('beauty', 'TaxonClosure')
+
+    parents = dict(Taxon.objects.values_list('id', 'parent_id'))
+    links = []
+    for taxon_id in parents:
+        ancestor_id, depth = taxon_id, 0
+        seen = set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            links.append(TaxonClosure(ancestor_id=ancestor_id, descendant_id=taxon_id, depth=depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    TaxonClosure.objects.bulk_create(links, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beauty', '0013_item_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaxonClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(verbose_name='階層差')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='beauty.taxon')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='beauty.taxon')),
+            ],
+            options={
+                'verbose_name': 'カテゴリ階層索引',
+                'verbose_name_plural': 'カテゴリ階層索引',
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='beauty_closure_desc_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='uniq_taxon_closure_pair')],
+            },
+        ),
+        migrations.RunPython(fill_closure, migrations.RunPython.noop),
+    ]
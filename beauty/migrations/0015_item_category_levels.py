@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_category_levels(apps, schema_editor):
+    """
+    既存アイテムの大分類・中分類を祖先・子孫テーブルから設定する
+    大分類は最上位の祖先、中分類はその1つ下（大分類そのものなら None）。同じ値の組ごとに1文で更新する
+    """
+    Item = apps.get_model('beauty', 'Item')
+    TaxonClosure = apps.get_model('beauty', 'TaxonClosure')
+
+    ancestors = {}
+    for descendant_id, ancestor_id, depth in TaxonClosure.objects.values_list('descendant_id', 'ancestor_id', 'depth'):
+        ancestors.setdefault(descendant_id, {})[depth] = ancestor_id
+    groups = {}
+    for taxon_id, by_depth in ancestors.items():
+        top = max(by_depth)
+        levels = (by_depth[top], by_depth.get(top - 1) if top else None)
+        groups.setdefault(levels, []).append(taxon_id)
+    for (root_id, middle_id), product_type_ids in groups.items():
+        Item.objects.filter(product_type_id__in=product_type_ids).update(
+            category_root_id=root_id, category_middle_id=middle_id
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beauty', '0014_taxonclosure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='category_middle',
+            field=models.ForeignKey(blank=True, editable=False, limit_choices_to={'depth': 1}, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='middle_items', to='beauty.taxon', verbose_name='中分類'),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='category_root',
+            field=models.ForeignKey(blank=True, editable=False, limit_choices_to={'depth': 0}, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='root_items', to='beauty.taxon', verbose_name='大分類'),
+        ),
+        migrations.RunPython(fill_category_levels, migrations.RunPython.noop),
+    ]
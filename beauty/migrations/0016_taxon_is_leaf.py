@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:41
+
+from django.db import migrations, models
+
+
+def fill_is_leaf(apps, schema_editor):
+    """子を持つカテゴリを葉でないとする（追加時の既定値は True）"""
+    Taxon = apps.get_model('beauty', 'Taxon')
+    Taxon.objects.filter(
+        id__in=Taxon.objects.filter(parent__isnull=False).values('parent_id')
+    ).update(is_leaf=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beauty', '0015_item_category_levels'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taxon',
+            name='is_leaf',
+            field=models.BooleanField(default=True, editable=False, verbose_name='葉ノード'),
+        ),
+        migrations.RunPython(fill_is_leaf, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='taxon',
+            index=models.Index(condition=models.Q(('is_leaf', True)), fields=['depth', 'name'], name='beauty_taxon_leaf_idx'),
+        ),
+    ]
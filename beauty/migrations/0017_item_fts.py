@@ -0,0 +1,81 @@
+from django.db import migrations
+
+
+FTS_TABLE = 'beauty_item_fts'
+
+CREATE_STATEMENTS = [
+    # 本文は beauty_item を参照する外部コンテンツ型（索引だけを持つ）
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        name, brand, memo,
+        content='beauty_item', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER beauty_item_fts_ai AFTER INSERT ON beauty_item BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, brand, memo) VALUES (new.id, new.name, new.brand, new.memo);
+    END
+    """,
+    f"""
+    CREATE TRIGGER beauty_item_fts_ad AFTER DELETE ON beauty_item BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, brand, memo)
+        VALUES ('delete', old.id, old.name, old.brand, old.memo);
+    END
+    """,
+    # 検索対象の列が変わったときだけ索引を更新する（通知日などの一括更新では動かない）
+    f"""
+    CREATE TRIGGER beauty_item_fts_au AFTER UPDATE OF name, brand, memo ON beauty_item BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, brand, memo)
+        VALUES ('delete', old.id, old.name, old.brand, old.memo);
+        INSERT INTO {FTS_TABLE}(rowid, name, brand, memo) VALUES (new.id, new.name, new.brand, new.memo);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+DROP_STATEMENTS = [
+    'DROP TRIGGER IF EXISTS beauty_item_fts_ai',
+    'DROP TRIGGER IF EXISTS beauty_item_fts_ad',
+    'DROP TRIGGER IF EXISTS beauty_item_fts_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def fts5_trigram_available(cursor):
+    """FTS5 と trigram トークナイザ（SQLite 3.34 以降）が使えるか"""
+    try:
+        cursor.execute("CREATE VIRTUAL TABLE temp.beauty_fts_probe USING fts5(x, tokenize='trigram')")
+    except Exception:
+        return False
+    cursor.execute('DROP TABLE temp.beauty_fts_probe')
+    return True
+
+
+def create_item_fts(apps, schema_editor):
+    """SQLite で FTS5 が使える場合だけ索引とトリガーを作る（それ以外は search.py が LIKE で検索する）"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if not fts5_trigram_available(cursor):
+            return
+        for sql in CREATE_STATEMENTS:
+            cursor.execute(sql)
+
+
+def drop_item_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in DROP_STATEMENTS:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beauty', '0016_taxon_is_leaf'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_item_fts, drop_item_fts),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:46
+
+import importlib
+from django.conf import settings
+from django.db import migrations, models
+from beauty.search import install_fts, search_key, uninstall_fts
+
+
+def fill_search_keys(apps, schema_editor):
+    """既存アイテムの name_key / brand_key を計算する"""
+    Item = apps.get_model('beauty', 'Item')
+    batch = []
+    for item in Item.objects.only('id', 'name', 'brand').iterator(chunk_size=1000):
+        item.name_key = search_key(item.name)
+        item.brand_key = search_key(item.brand)
+        batch.append(item)
+        if len(batch) >= 1000:
+            Item.objects.bulk_update(batch, ['name_key', 'brand_key'])
+            batch = []
+    Item.objects.bulk_update(batch, ['name_key', 'brand_key'])
+
+
+def create_fts(apps, schema_editor):
+    # 列の追加でテーブルが作り直されトリガーが消えるため、キーの列を加えて作り直す
+    install_fts(schema_editor)
+
+
+def restore_previous_fts(apps, schema_editor):
+    uninstall_fts(schema_editor)
+    importlib.import_module('beauty.migrations.0017_item_fts').create_item_fts(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beauty', '0017_item_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='brand_key',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='ブランド（検索キー）'),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='name_key',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='商品名（検索キー）'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['user', 'name_key'], name='beauty_item_user_namekey_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['user', 'brand_key'], name='beauty_item_user_brandkey_idx'),
+        ),
+        migrations.RunPython(fill_search_keys, migrations.RunPython.noop),
+        migrations.RunPython(create_fts, restore_previous_fts),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:48
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def bucket_for(expires_on, today):
+    """期限日の区分キー（この時点の beauty.expiry.bucket_for の写し）"""
+    days = (expires_on - today).days
+    if days < 0:
+        return 'expired'
+    if days <= 7:
+        return 'week'
+    if days <= 14:
+        return 'biweek'
+    if days <= 30:
+        return 'month'
+    return 'safe'
+
+
+def fill_risk_flag(apps, schema_editor):
+    """既存アイテムの期限区分を今日の日付で計算する（以降は refresh_risk_flags が日次で更新）"""
+    Item = apps.get_model('beauty', 'Item')
+    today = timezone.localdate()
+    batch = []
+    for item in Item.objects.only('id', 'expires_on').iterator(chunk_size=1000):
+        item.risk_flag = bucket_for(item.expires_on, today)
+        batch.append(item)
+        if len(batch) >= 1000:
+            Item.objects.bulk_update(batch, ['risk_flag'])
+            batch = []
+    Item.objects.bulk_update(batch, ['risk_flag'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beauty', '0018_item_search_keys'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='item',
+            name='risk_flag',
+            field=models.CharField(blank=True, choices=[('expired', '期限切れ'), ('week', '7日以内'), ('biweek', '14日以内'), ('month', '30日以内'), ('safe', '余裕あり')], editable=False, max_length=10, verbose_name='期限リスク'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['user', 'risk_flag', 'expires_on', 'id'], name='beauty_item_user_risk_idx'),
+        ),
+        migrations.RunPython(fill_risk_flag, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-17 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beauty', '0019_item_risk_flag'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['next_alert_on', 'user'], name='beauty_item_alert_user_idx'),
+        ),
+        # next_alert_on 単独の索引は複合索引の先頭と同じなので外す
+        # （AlterField のままだと SQLite はテーブルを作り直し、FTS のトリガーも消えるため索引だけを落とす）
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'DROP INDEX "beauty_item_next_alert_on_d97e2553"',
+                    'CREATE INDEX "beauty_item_next_alert_on_d97e2553" ON "beauty_item" ("next_alert_on")',
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='item',
+                    name='next_alert_on',
+                    field=models.DateField(blank=True, null=True, verbose_name='次回通知日'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-17 10:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beauty', '0020_item_alert_user_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['expires_on', 'risk_flag', 'user'], name='beauty_item_exp_risk_idx'),
+        ),
+    ]
@@ -1,10 +1,17 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
+from django.core.exceptions import ValidationError
 import os
 import uuid
 import re
-from datetime import datetime
+import time
+import zoneinfo
+from datetime import datetime, timedelta
+from . import taxonomy
+from .search import search_key
+from .expiry import bucket_for
 
 def get_safe_filename(filename):
     """
@@ -51,6 +58,8 @@ class Taxon(models.Model):
     )
     depth = models.IntegerField(default=0, verbose_name="階層レベル")
     full_path = models.CharField(max_length=300, blank=True, verbose_name="フルパス")
+    # 子カテゴリを持たないか（子の追加・移動は save、削除は signals.py で更新）
+    is_leaf = models.BooleanField(default=True, editable=False, verbose_name="葉ノード")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
 
@@ -72,27 +81,187 @@ class Taxon(models.Model):
         help_text="月末で締めるか、同日で締めるかを指定します。"
     )
 
-    @property
-    def is_leaf(self):
-        return not self.children.exists()
-
     class Meta:
         verbose_name = "カテゴリ"
         verbose_name_plural = "カテゴリ"
         ordering = ['depth', 'name']
+        indexes = [
+            # 葉ノードの一覧（SQLite は真偽値の列だけの条件に通常の索引を使わないため部分インデックスにする）
+            models.Index(fields=['depth', 'name'], condition=models.Q(is_leaf=True), name='beauty_taxon_leaf_idx'),
+        ]
+
+    def clean(self):
+        # 自分自身や子孫の下には移動できない
+        if self.pk and self.parent_id and TaxonClosure.objects.filter(
+            ancestor_id=self.pk, descendant_id=self.parent_id
+        ).exists():
+            raise ValidationError({'parent': '自分自身または子孫のカテゴリは親にできません。'})
 
     def save(self, *args, **kwargs):
+        adding = self._state.adding
+        old_parent_id, old_name = None, self.name
+        if not adding:
+            old_parent_id, old_name = (
+                Taxon.objects.filter(pk=self.pk).values_list('parent_id', 'name').first() or (None, self.name)
+            )
+
         if self.parent:
             self.depth = self.parent.depth + 1
             self.full_path = f"{self.parent.full_path} > {self.name}"
         else:
             self.depth = 0
             self.full_path = self.name
-        super().save(*args, **kwargs)
+
+        # 祖先・子孫テーブルも同じトランザクションで更新する
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                TaxonClosure.add_node(self)
+            elif old_parent_id != self.parent_id:
+                TaxonClosure.move_subtree(self)
+            if old_parent_id != self.parent_id:
+                # 新しい親は葉でなくなり、元の親は子がいなくなれば葉に戻る
+                Taxon.refresh_leaf_flags([pk for pk in (old_parent_id, self.parent_id) if pk])
+                # 配下のカテゴリに属するアイテムの大・中分類も付け替える
+                Item.resync_categories(
+                    TaxonClosure.objects.filter(ancestor_id=self.pk).values_list('descendant_id', flat=True)
+                )
+            if not adding and (old_parent_id != self.parent_id or old_name != self.name):
+                # 子孫の depth / full_path は自分の値から作られているため、配下をまとめて作り直す
+                Taxon.rebuild_paths(self.pk)
 
     def __str__(self):
         return self.full_path
 
+    @staticmethod
+    def rebuild_paths(taxon_id=None):
+        """
+        サブツリー（省略時は木全体）の depth / full_path を親から順に計算し直し、
+        値が変わった行だけ bulk_update する。更新した件数を返す
+        """
+        qs = Taxon.objects.all()
+        if taxon_id is not None:
+            qs = qs.filter(id__in=Taxon.subtree_ids(taxon_id))
+        nodes = {t.id: t for t in qs.only('id', 'name', 'parent_id', 'depth', 'full_path')}
+
+        children = {}
+        for node in nodes.values():
+            children.setdefault(node.parent_id, []).append(node)
+
+        # 起点はサブツリーの根（親が対象外）。その親の値は DB から読む
+        outer_parent_ids = {n.parent_id for n in nodes.values() if n.parent_id and n.parent_id not in nodes}
+        base = {
+            p['id']: (p['depth'] + 1, f"{p['full_path']} > ")
+            for p in Taxon.objects.filter(id__in=outer_parent_ids).values('id', 'depth', 'full_path')
+        }
+        stack = [
+            (n, *base.get(n.parent_id, (0, '')))
+            for n in nodes.values() if n.parent_id is None or n.parent_id not in nodes
+        ]
+
+        now = timezone.now()
+        changed = []
+        while stack:
+            node, depth, prefix = stack.pop()
+            full_path = f"{prefix}{node.name}"
+            if (node.depth, node.full_path) != (depth, full_path):
+                node.depth, node.full_path = depth, full_path
+                node.updated_at = now
+                changed.append(node)
+            stack.extend((child, depth + 1, f"{full_path} > ") for child in children.get(node.id, ()))
+
+        # updated_at も進める（他プロセスのスナップショットは最終更新日時で変更を検知する）
+        Taxon.objects.bulk_update(changed, ['depth', 'full_path', 'updated_at'], batch_size=500)
+        if changed:
+            # bulk_update はシグナルを送らないため、ここでスナップショットを無効化する
+            transaction.on_commit(taxonomy.invalidate)
+        return len(changed)
+
+    @staticmethod
+    def refresh_leaf_flags(taxon_ids):
+        """指定カテゴリの is_leaf を子の有無から設定し直す（1クエリ）"""
+        return Taxon.objects.filter(id__in=taxon_ids).update(
+            is_leaf=~models.Exists(Taxon.objects.filter(parent_id=models.OuterRef('pk'))),
+            updated_at=timezone.now(),
+        )
+
+    @staticmethod
+    def subtree_ids(taxon_id):
+        """指定カテゴリ自身と全子孫の id（サブクエリとして1クエリに埋め込める）"""
+        return TaxonClosure.objects.filter(ancestor_id=taxon_id).values('descendant_id')
+
+
+# ===== TaxonClosureモデル =====
+class TaxonClosure(models.Model):
+    """
+    カテゴリの祖先・子孫の全組み合わせ（自分自身との組も depth=0 で持つ）
+    階層の深さに関係なく子孫・祖先を1クエリで引くための索引。Taxon.save で更新し、削除は CASCADE で追従する
+    """
+    ancestor = models.ForeignKey(Taxon, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Taxon, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField(verbose_name="階層差")
+
+    class Meta:
+        verbose_name = "カテゴリ階層索引"
+        verbose_name_plural = "カテゴリ階層索引"
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='uniq_taxon_closure_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['descendant', 'depth'], name='beauty_closure_desc_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+    @classmethod
+    def add_node(cls, taxon):
+        """新しいカテゴリの行（自分自身 + 親の祖先すべて）を追加する"""
+        links = [cls(ancestor_id=taxon.pk, descendant_id=taxon.pk, depth=0)]
+        if taxon.parent_id:
+            links += [
+                cls(ancestor_id=ancestor_id, descendant_id=taxon.pk, depth=depth + 1)
+                for ancestor_id, depth in cls.objects.filter(descendant_id=taxon.parent_id)
+                .values_list('ancestor_id', 'depth')
+            ]
+        cls.objects.bulk_create(links)
+
+    @classmethod
+    def category_levels(cls, taxon_ids):
+        """
+        カテゴリごとの (大分類id, 中分類id) を1クエリで返す
+        大分類は最上位の祖先、中分類はその1つ下（大分類そのものなら None）
+        """
+        ancestors = {}
+        for descendant_id, ancestor_id, depth in (
+            cls.objects.filter(descendant_id__in=taxon_ids).values_list('descendant_id', 'ancestor_id', 'depth')
+        ):
+            ancestors.setdefault(descendant_id, {})[depth] = ancestor_id
+        levels = {}
+        for taxon_id, by_depth in ancestors.items():
+            top = max(by_depth)
+            levels[taxon_id] = (by_depth[top], by_depth.get(top - 1) if top else None)
+        return levels
+
+    @classmethod
+    def move_subtree(cls, taxon):
+        """カテゴリの親が変わったとき、配下のサブツリーと旧祖先の組を付け替える"""
+        subtree = list(cls.objects.filter(ancestor_id=taxon.pk).values_list('descendant_id', 'depth'))
+        subtree_ids = [descendant_id for descendant_id, _ in subtree]
+
+        # サブツリーの外側（旧祖先）との組を削除
+        cls.objects.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+
+        if taxon.parent_id:
+            new_ancestors = list(
+                cls.objects.filter(descendant_id=taxon.parent_id).values_list('ancestor_id', 'depth')
+            )
+            cls.objects.bulk_create([
+                cls(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=up + down + 1)
+                for ancestor_id, up in new_ancestors
+                for descendant_id, down in subtree
+            ])
+
 
 # ===== Itemモデル（修正版） =====
 class Item(BaseModel):
@@ -113,6 +282,9 @@ class Item(BaseModel):
     
     name = models.CharField(max_length=200, verbose_name="商品名")
     brand = models.CharField(max_length=100, blank=True, verbose_name="ブランド")
+    # 表記ゆれを吸収した検索キー（search.search_key。save で更新）
+    name_key = models.CharField(max_length=200, blank=True, editable=False, verbose_name="商品名（検索キー）")
+    brand_key = models.CharField(max_length=100, blank=True, editable=False, verbose_name="ブランド（検索キー）")
     color_code = models.CharField(max_length=50, blank=True, verbose_name="色番/カラー")
     image_url = models.CharField(max_length=500, blank=True, verbose_name="画像URL")
     # アップロード時に安全なファイル名に変換する
@@ -134,31 +306,180 @@ class Item(BaseModel):
     )
     finished_at = models.DateField(null=True, blank=True, verbose_name="使用終了日")
     
+    # 期限の区分（expiry.EXPIRY_BUCKETS）。save で計算し、日付が変わった分は refresh_risk_flags で更新する
     RISK_CHOICES = [
-        ('low', '低'),
-        ('mid', '中'),
-        ('high', '高'),
+        ('expired', '期限切れ'),
+        ('week', '7日以内'),
+        ('biweek', '14日以内'),
+        ('month', '30日以内'),
+        ('safe', '余裕あり'),
     ]
     risk_flag = models.CharField(
         max_length=10,
         choices=RISK_CHOICES,
         blank=True,
+        editable=False,
         verbose_name="期限リスク"
     )
     
     memo = models.TextField(blank=True, verbose_name="メモ")
-    
+
+    # product_type の大分類・中分類（集計や絞り込みで Taxon を辿らないための写し。save と Taxon の移動で更新）
+    category_root = models.ForeignKey(
+        Taxon,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='root_items',
+        limit_choices_to={'depth': 0},
+        verbose_name="大分類"
+    )
+    category_middle = models.ForeignKey(
+        Taxon,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='middle_items',
+        limit_choices_to={'depth': 1},
+        verbose_name="中分類"
+    )
+
+    # 次に通知が発生しうる日付と種別（通知生成はこの列の範囲検索だけで対象を絞り込む）
+    next_alert_on = models.DateField(null=True, blank=True, verbose_name="次回通知日")
+    next_alert_type = models.CharField(max_length=10, blank=True, verbose_name="次回通知種別")
+    # 送信済みの期限前通知（ALERT_FLAGS のビット和）。ダイジェスト通知でも1回限りを判定できるようにする
+    alert_sent_flags = models.PositiveSmallIntegerField(default=0, verbose_name="送信済み通知フラグ")
+
+    # 期限前通知の種別と「期限の何日前から」か
+    ALERT_THRESHOLDS = (
+        ('D30', 30),
+        ('D14', 14),
+        ('D7', 7),
+    )
+    ALERT_FLAGS = {
+        'D30': 1,
+        'D14': 2,
+        'D7': 4,
+    }
+
+    @classmethod
+    def decode_alert_flags(cls, flags):
+        """alert_sent_flags を送信済み種別の集合に変換する"""
+        return {t for t, bit in cls.ALERT_FLAGS.items() if flags & bit}
+
+    @classmethod
+    def encode_alert_flags(cls, sent_types):
+        """送信済み種別の集合を alert_sent_flags の値に変換する"""
+        return sum(bit for t, bit in cls.ALERT_FLAGS.items() if t in sent_types)
+
+    def compute_next_alert(self, today, sent_types=()):
+        """
+        次回通知日と種別を計算する
+        sent_types: 送信済みの期限前通知種別（OVERWEEK は「当日分送信済み」を表す）
+        """
+        if self.status != 'using' or not self.expires_on:
+            return None, ''
+
+        candidates = []
+        # 期限前通知：期限当日までに未送信のもの（開始日が過去なら即時対象）
+        if self.expires_on >= today:
+            for notification_type, days in self.ALERT_THRESHOLDS:
+                if notification_type not in sent_types:
+                    candidates.append((self.expires_on - timedelta(days=days), notification_type))
+
+        # 期限切れ通知：期限翌日以降の最初の月曜日（当日分が送信済みなら翌日以降）
+        start = max(
+            self.expires_on + timedelta(days=1),
+            today + timedelta(days=1) if 'OVERWEEK' in sent_types else today,
+        )
+        candidates.append((start + timedelta(days=(7 - start.weekday()) % 7), 'OVERWEEK'))
+
+        return min(candidates)
+
+    def refresh_next_alert(self, today=None):
+        """送信済み通知を参照して next_alert_on / next_alert_type を更新する（保存はしない）"""
+        today = today or UserProfile.local_today(self.user_id)
+        self.refresh_risk_flag(today)
+        sent_types = self.decode_alert_flags(self.alert_sent_flags)
+        # 期限切れ通知の当日分は月曜日に期限切れのアイテムだけ確認すれば良い
+        if self.pk and self.expires_on and self.expires_on < today and today.weekday() == 0:
+            overweek_today = (
+                Notification.objects
+                .filter(user_id=self.user_id, type='OVERWEEK', scheduled_on=today)
+                .filter(models.Q(item_id=self.pk) | models.Q(item__isnull=True))
+                .values_list('item_id', 'item_ids')
+            )
+            if any(item_id == self.pk or self.pk in (item_ids or []) for item_id, item_ids in overweek_today):
+                sent_types.add('OVERWEEK')
+        self.next_alert_on, self.next_alert_type = self.compute_next_alert(today, sent_types)
+
+    # risk_flag を計算したときの (期限日,)。未計算は None（同じ期限日のまま保存するなら計算し直さない）
+    _risk_flag_for = None
+
+    def refresh_risk_flag(self, today=None):
+        """期限日と今日の日付から risk_flag を設定する（保存はしない）"""
+        if not self.expires_on:
+            self.risk_flag = ''
+        else:
+            self.risk_flag = bucket_for(self.expires_on, today or UserProfile.local_today(self.user_id))
+        self._risk_flag_for = (self.expires_on,)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'product_type' in update_fields or 'product_type_id' in update_fields:
+            self.sync_categories()
+            if update_fields is not None:
+                update_fields = kwargs['update_fields'] = {*update_fields, 'category_root', 'category_middle'}
+        self.name_key = search_key(self.name)
+        self.brand_key = search_key(self.brand)
+        # 編集はその日のうちに一覧タブへ反映させる（期限日を書き込む保存だけ。
+        # refresh_next_alert で同じ期限日について計算済みなら、その日付の区分をそのまま使う）
+        writes_expiry = update_fields is None or 'expires_on' in update_fields
+        if writes_expiry and self._risk_flag_for != (self.expires_on,):
+            self.refresh_risk_flag()
+        if update_fields is not None:
+            kwargs['update_fields'] = {
+                *update_fields,
+                *(['name_key'] if 'name' in update_fields else []),
+                *(['brand_key'] if 'brand' in update_fields else []),
+                *(['risk_flag'] if 'expires_on' in update_fields else []),
+            }
+        super().save(*args, **kwargs)
+
+    def sync_categories(self):
+        """product_type から大分類・中分類を設定する（保存はしない）"""
+        self.category_root_id, self.category_middle_id = TaxonClosure.category_levels(
+            [self.product_type_id]
+        ).get(self.product_type_id, (None, None))
+
+    @classmethod
+    def resync_categories(cls, taxon_ids):
+        """指定カテゴリのアイテムの大分類・中分類を、同じ値の組ごとにまとめて更新する"""
+        groups = {}
+        for taxon_id, levels in TaxonClosure.category_levels(taxon_ids).items():
+            groups.setdefault(levels, []).append(taxon_id)
+        updated = 0
+        for (root_id, middle_id), product_type_ids in groups.items():
+            updated += cls.objects.filter(product_type_id__in=product_type_ids).exclude(
+                category_root_id=root_id, category_middle_id=middle_id
+            ).update(category_root_id=root_id, category_middle_id=middle_id)
+        return updated
+
     @property
     def main_category(self):
         """大分類を取得"""
-        taxon = self.product_type
-        while taxon.parent:
-            taxon = taxon.parent
-        return taxon
+        if self.category_root_id:
+            return self.category_root
+        # 未補完の行（backfill_item_categories 実行前）は祖先から1クエリで取得
+        return Taxon.objects.filter(descendant_links__descendant_id=self.product_type_id, depth=0).first()
     
     @property
     def middle_category(self):
         """中分類を取得"""
+        if self.category_root_id:
+            return self.category_middle
         taxon = self.product_type
         if taxon.depth == 2 and taxon.parent:
             return taxon.parent
@@ -170,15 +491,40 @@ class Item(BaseModel):
         verbose_name = "アイテム"
         verbose_name_plural = "アイテム"
         ordering = ['-created_at']
+        indexes = [
+            # 一覧・集計: ユーザーで絞って期限の範囲検索／期限順（id はキーセットページングのタイブレーク）
+            models.Index(fields=['user', 'expires_on', 'id'], name='beauty_item_user_exp_idx'),
+            # 一覧・ホーム: 登録日順
+            models.Index(fields=['user', 'created_at', 'id'], name='beauty_item_user_created_idx'),
+            # 通知生成: 使用中アイテムの期限境界の範囲検索
+            models.Index(
+                fields=['expires_on'], condition=models.Q(status='using'), name='beauty_item_using_exp_idx'
+            ),
+            # 通知生成: 次回通知日が到来したアイテムの (id, user) を索引だけで読む
+            models.Index(fields=['next_alert_on', 'user'], name='beauty_item_alert_user_idx'),
+            # 通知生成の差分実行: 前回以降に更新されたアイテム
+            models.Index(fields=['updated_at'], name='beauty_item_updated_idx'),
+            # 一覧タブ・件数: ユーザーで絞って区分ごと（期限順のキーセットページングにも使う）
+            models.Index(fields=['user', 'risk_flag', 'expires_on', 'id'], name='beauty_item_user_risk_idx'),
+            # 区分の日次更新: 境界をまたいだ期限日の範囲を索引だけで読む
+            models.Index(fields=['expires_on', 'risk_flag', 'user'], name='beauty_item_exp_risk_idx'),
+            # 入力補完: ユーザーごとの検索キーの前方一致（範囲検索）
+            models.Index(fields=['user', 'name_key'], name='beauty_item_user_namekey_idx'),
+            models.Index(fields=['user', 'brand_key'], name='beauty_item_user_brandkey_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.product_type})"
 
-# ===== Notificationモデル（変更なし） =====
+# ===== Notificationモデル =====
 class Notification(BaseModel):
-    """通知"""
+    """
+    通知
+    - アイテム単位: item に対象アイテム、body に本文を保存
+    - ダイジェスト: item は空で (user, type, 日付) ごとに1行、対象は item_ids、本文は読み出し時に組み立てる
+    """
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, null=True, blank=True)
     
     TYPE_CHOICES = [
         ('D30', '30日前'),
@@ -188,18 +534,436 @@ class Notification(BaseModel):
     ]
     type = models.CharField(max_length=10, choices=TYPE_CHOICES, verbose_name="通知種別")
     title = models.CharField(max_length=200, verbose_name="通知タイトル")
-    body = models.TextField(verbose_name="通知本文")
+    body = models.TextField(blank=True, verbose_name="通知本文")
+    item_ids = models.JSONField(default=list, blank=True, verbose_name="対象アイテムID")
+    item_count = models.PositiveIntegerField(default=1, verbose_name="対象アイテム数")
     scheduled_for = models.DateTimeField(verbose_name="通知予定時刻")
-    read_at = models.DateTimeField(null=True, blank=True, verbose_name="既読時刻")
+    # 重複防止用の通知日（ローカル日付）。scheduled_for の日付部分と同じ値を持つ
+    scheduled_on = models.DateField(verbose_name="通知予定日")
+    # 既読状態は持たない。NotificationReadMark.read_through より後の通知が未読
     
     class Meta:
         verbose_name = "通知"
         verbose_name_plural = "通知"
         ordering = ['-scheduled_for']
+        indexes = [
+            # 未読判定 (user, type, scheduled_for > 既読位置) 用
+            models.Index(fields=['user', 'type', 'scheduled_for'], name='beauty_notif_user_type_sf_idx'),
+        ]
+        constraints = [
+            # 同じアイテム・種別・日付の通知は1件のみ（一括INSERT時の重複を DB 側で防ぐ）
+            models.UniqueConstraint(
+                fields=['item', 'type', 'scheduled_on'],
+                name='uniq_notification_item_type_date',
+            ),
+            # ダイジェストはユーザー・種別・日付ごとに1件のみ
+            models.UniqueConstraint(
+                fields=['user', 'type', 'scheduled_on'],
+                condition=models.Q(item__isnull=True),
+                name='uniq_notification_digest_user_type_date',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.user}"
 
+    @staticmethod
+    def format_body(notification_type, name, expires_on, today):
+        """アイテム1件分の通知本文"""
+        if notification_type == 'OVERWEEK':
+            return f'{name}の使用期限が過ぎています（期限: {expires_on}）'
+        return f'{name}の使用期限が{(expires_on - today).days}日後です（期限: {expires_on}）'
+
+    def render_body(self):
+        """本文を返す（ダイジェストは対象アイテムから組み立てる）"""
+        if self.body or self.item_id:
+            return self.body
+        items = Item.objects.filter(id__in=self.item_ids).only('name', 'expires_on').order_by('expires_on', 'id')
+        return '\n'.join(
+            self.format_body(self.type, item.name, item.expires_on, self.scheduled_on) for item in items
+        )
+
+# ===== NotificationReadMarkモデル =====
+class NotificationReadMark(models.Model):
+    """ユーザー・通知種別ごとの既読位置（この時刻以前の通知は既読）"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notification_read_marks')
+    type = models.CharField(max_length=10, choices=Notification.TYPE_CHOICES, verbose_name="通知種別")
+    read_through = models.DateTimeField(verbose_name="既読位置")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+
+    class Meta:
+        verbose_name = "通知既読位置"
+        verbose_name_plural = "通知既読位置"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'type'], name='uniq_notification_read_mark_user_type'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.type} ({self.read_through})"
+
+    @classmethod
+    def mark_read(cls, user_id, notification_type, read_through=None):
+        """既読位置を1行の UPSERT で進める"""
+        now = timezone.now()
+        cls.objects.bulk_create(
+            [cls(user_id=user_id, type=notification_type, read_through=read_through or now, updated_at=now)],
+            update_conflicts=True,
+            unique_fields=['user', 'type'],
+            update_fields=['read_through', 'updated_at'],
+        )
+
+    @classmethod
+    def unread_q(cls, user_id):
+        """指定ユーザーの未読通知を表す条件（既読位置が無い種別はすべて未読）"""
+        marks = dict(cls.objects.filter(user_id=user_id).values_list('type', 'read_through'))
+        q = models.Q()
+        for notification_type, _ in Notification.TYPE_CHOICES:
+            if notification_type in marks:
+                q |= models.Q(type=notification_type, scheduled_for__gt=marks[notification_type])
+            else:
+                q |= models.Q(type=notification_type)
+        return q
+
+# ===== NotificationCounterモデル =====
+class NotificationCounter(models.Model):
+    """
+    ユーザーごとの未読通知数（通知サマリー用の集計結果）
+    - 通知の生成・既読化・削除と同じトランザクションで増減する
+    - 行が無いユーザーは初回の読み出し時に作る（ずれた場合は rebuild_notification_counters で作り直す）
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter'
+    )
+    expired = models.PositiveIntegerField(default=0, verbose_name="期限切れ")
+    week = models.PositiveIntegerField(default=0, verbose_name="7日以内")
+    biweek = models.PositiveIntegerField(default=0, verbose_name="14日以内")
+    month = models.PositiveIntegerField(default=0, verbose_name="30日以内")
+    total = models.PositiveIntegerField(default=0, verbose_name="合計")
+    # 変更のたびに増える（クライアントの差分検知用）
+    version = models.PositiveBigIntegerField(default=0, verbose_name="バージョン")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+
+    # 通知種別 -> 列名
+    TYPE_FIELDS = {
+        'OVERWEEK': 'expired',
+        'D7': 'week',
+        'D14': 'biweek',
+        'D30': 'month',
+    }
+
+    # 変更の合図（ユーザーごとのキャッシュ）の有効期限。消えても SSE は DB の version で確認し直すだけ
+    CHANGE_CACHE_TIMEOUT = 60 * 60
+
+    class Meta:
+        verbose_name = "未読通知数"
+        verbose_name_plural = "未読通知数"
+
+    def __str__(self):
+        return f"{self.user} ({self.total})"
+
+    def buckets(self):
+        return {field: getattr(self, field) for field in self.TYPE_FIELDS.values()}
+
+    @classmethod
+    def compute(cls, user_ids):
+        """
+        指定ユーザーの未読数を通知テーブルから集計する（既読位置と結合した1クエリ）
+        戻り値: user_id -> NotificationCounter（未保存）
+        """
+        rows = cls._unread_counts(Notification.objects.filter(user_id__in=user_ids))
+        counters = {user_id: cls(user_id=user_id) for user_id in user_ids}
+        for row in rows:
+            counter = counters[row['user_id']]
+            field = cls.TYPE_FIELDS.get(row['type'])
+            if field:
+                setattr(counter, field, row['cnt'])
+        for counter in counters.values():
+            counter.total = sum(counter.buckets().values())
+        return counters
+
+    @staticmethod
+    def _unread_counts(notifications):
+        """通知のうち未読（同じユーザー・種別の既読位置より後）の件数を (user_id, type) ごとに集計する"""
+        read_through = NotificationReadMark.objects.filter(
+            user=models.OuterRef('user_id'), type=models.OuterRef('type')
+        ).values('read_through')
+        return (
+            notifications
+            .annotate(read_through=models.Subquery(read_through))
+            .filter(models.Q(read_through__isnull=True) | models.Q(scheduled_for__gt=models.F('read_through')))
+            .values('user_id', 'type')
+            .annotate(cnt=models.Sum('item_count'))
+        )
+
+    @classmethod
+    def get_or_build(cls, user_id):
+        """カウンタ行を返す。無ければ集計して作る"""
+        counter = cls.objects.filter(user_id=user_id).first()
+        if counter is None:
+            # 通知生成と書き込みロックで直列化し、集計と作成の間に増分を取りこぼさない
+            with transaction.atomic():
+                counter = cls.compute([user_id])[user_id]
+                cls.objects.bulk_create([counter], ignore_conflicts=True)
+                counter = cls.objects.get(user_id=user_id)
+        return counter
+
+    @staticmethod
+    def change_key(user_id):
+        return f'beauty:notifications:changed:{user_id}'
+
+    @classmethod
+    def signal_changed(cls, user_ids):
+        """
+        コミット後に、カウンタが変わったことをキャッシュに書く（値は毎回新しいトークン）
+        SSE はこのキーだけを見て、変わったときに限りカウンタを DB から読む
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+
+        def publish():
+            token = time.time_ns()
+            cache.set_many({cls.change_key(user_id): token for user_id in user_ids}, cls.CHANGE_CACHE_TIMEOUT)
+
+        transaction.on_commit(publish)
+
+    @classmethod
+    def add(cls, increments):
+        """
+        user_id -> {通知種別: 件数} を加算する（呼び出し側のトランザクション内で使う）
+        行の無いユーザーは読み出し時に集計されるので飛ばす
+        """
+        for user_id, by_type in increments.items():
+            values = {}
+            for notification_type, count in by_type.items():
+                field = cls.TYPE_FIELDS[notification_type]
+                values[field] = models.F(field) + count
+            values['total'] = models.F('total') + sum(by_type.values())
+            values['version'] = models.F('version') + 1
+            values['updated_at'] = timezone.now()
+            cls.objects.filter(user_id=user_id).update(**values)
+        cls.signal_changed(increments)
+
+    @classmethod
+    def discard(cls, notifications):
+        """
+        削除する通知のうち未読の分を引く（呼び出し側のトランザクション内で、削除の前に使う）
+        アイテムの削除（CASCADE）・管理画面での削除・アーカイブで呼ぶ
+        """
+        decrements = {}
+        for row in cls._unread_counts(notifications):
+            if row['type'] in cls.TYPE_FIELDS:
+                decrements.setdefault(row['user_id'], {})[row['type']] = -row['cnt']
+        cls.add(decrements)
+
+    @classmethod
+    def clear(cls, user_id, notification_type):
+        """指定種別を既読にした分を0に戻す（呼び出し側のトランザクション内で使う）"""
+        field = cls.TYPE_FIELDS[notification_type]
+        cls.objects.filter(user_id=user_id).update(
+            total=models.F('total') - models.F(field),
+            version=models.F('version') + 1,
+            updated_at=timezone.now(),
+            **{field: 0},
+        )
+        cls.signal_changed([user_id])
+
+# ===== UserProfileモデル =====
+class UserProfile(models.Model):
+    """ユーザーごとの設定（未作成のユーザーは既定値で扱う）"""
+    DEFAULT_TIMEZONE = 'Asia/Tokyo'
+
+    TIMEZONE_CHOICES = [
+        ('Asia/Tokyo', '日本 (Asia/Tokyo)'),
+        ('Asia/Seoul', '韓国 (Asia/Seoul)'),
+        ('Asia/Shanghai', '中国 (Asia/Shanghai)'),
+        ('Asia/Taipei', '台湾 (Asia/Taipei)'),
+        ('Asia/Singapore', 'シンガポール (Asia/Singapore)'),
+        ('Asia/Bangkok', 'タイ (Asia/Bangkok)'),
+        ('Asia/Kolkata', 'インド (Asia/Kolkata)'),
+        ('Australia/Sydney', 'オーストラリア東部 (Australia/Sydney)'),
+        ('Pacific/Auckland', 'ニュージーランド (Pacific/Auckland)'),
+        ('Europe/London', 'イギリス (Europe/London)'),
+        ('Europe/Paris', '中央ヨーロッパ (Europe/Paris)'),
+        ('America/New_York', 'アメリカ東部 (America/New_York)'),
+        ('America/Chicago', 'アメリカ中部 (America/Chicago)'),
+        ('America/Denver', 'アメリカ山岳部 (America/Denver)'),
+        ('America/Los_Angeles', 'アメリカ西部 (America/Los_Angeles)'),
+        ('Pacific/Honolulu', 'ハワイ (Pacific/Honolulu)'),
+        ('UTC', '協定世界時 (UTC)'),
+    ]
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='profile',
+        verbose_name="ユーザー"
+    )
+    timezone = models.CharField(
+        max_length=64,
+        choices=TIMEZONE_CHOICES,
+        default=DEFAULT_TIMEZONE,
+        verbose_name="タイムゾーン"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+
+    class Meta:
+        verbose_name = "ユーザー設定"
+        verbose_name_plural = "ユーザー設定"
+        indexes = [
+            # 時間帯ごとの通知生成で「このタイムゾーンのユーザー」を索引だけで引く
+            models.Index(fields=['timezone', 'user'], name='beauty_profile_tz_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} ({self.timezone})"
+
+    @classmethod
+    def local_today(cls, user_id):
+        """ユーザーのタイムゾーンでの今日の日付"""
+        tz_name = (
+            cls.objects.filter(user_id=user_id).values_list('timezone', flat=True).first()
+            or cls.DEFAULT_TIMEZONE
+        )
+        return timezone.localdate(timezone=zoneinfo.ZoneInfo(tz_name))
+
+    @classmethod
+    def timezone_q(cls, tz_name):
+        """指定タイムゾーンのユーザーのアイテムに絞る条件（(timezone, user) 索引で引く）"""
+        scope = models.Q(user_id__in=cls.objects.filter(timezone=tz_name).values('user_id'))
+        if tz_name == cls.DEFAULT_TIMEZONE:
+            # 設定未作成のユーザーは既定のタイムゾーン扱い
+            scope |= ~models.Q(user_id__in=cls.objects.values('user_id'))
+        return scope
+
+# ===== NotificationWatermarkモデル =====
+class NotificationWatermark(models.Model):
+    """通知生成の差分実行用ウォーターマーク（ユーザーIDブロック × タイムゾーンごとに1行）"""
+    key = models.CharField(max_length=100, unique=True, verbose_name="キー")
+    last_run_on = models.DateField(verbose_name="前回実行日")
+    last_item_updated_at = models.DateTimeField(null=True, blank=True, verbose_name="処理済みアイテム更新日時")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+
+    class Meta:
+        verbose_name = "通知生成ウォーターマーク"
+        verbose_name_plural = "通知生成ウォーターマーク"
+
+    def __str__(self):
+        return f"{self.key} ({self.last_run_on})"
+
+# ===== CommandLeaseモデル =====
+class CommandLease(models.Model):
+    """バッチ処理の多重起動を防ぐための DB リース（TTL 付きロック）"""
+    name = models.CharField(max_length=100, unique=True, verbose_name="リース名")
+    owner = models.CharField(max_length=200, verbose_name="保持者")
+    acquired_at = models.DateTimeField(verbose_name="取得日時")
+    heartbeat_at = models.DateTimeField(verbose_name="最終ハートビート")
+    expires_at = models.DateTimeField(verbose_name="有効期限")
+
+    class Meta:
+        verbose_name = "コマンドリース"
+        verbose_name_plural = "コマンドリース"
+
+    def __str__(self):
+        return f"{self.name} ({self.owner})"
+
+    @classmethod
+    def acquire(cls, name, owner, ttl_seconds):
+        """
+        リースを取得する。期限切れのリースは引き継ぐ
+        戻り値: (取得できたか, 引き継いだ前の保持者 or None)
+        """
+        now = timezone.now()
+        values = {
+            'owner': owner,
+            'acquired_at': now,
+            'heartbeat_at': now,
+            'expires_at': now + timedelta(seconds=ttl_seconds),
+        }
+        with transaction.atomic():
+            current = cls.objects.filter(name=name).first()
+            if current is None:
+                _, created = cls.objects.get_or_create(name=name, defaults=values)
+                return created, None
+            if current.owner != owner and current.expires_at >= now:
+                return False, None
+            # 期限切れ（またはハートビートが途絶えた）リースを条件付き UPDATE で引き継ぐ
+            taken = cls.objects.filter(
+                pk=current.pk, owner=current.owner, expires_at=current.expires_at
+            ).update(**values)
+            return bool(taken), (current.owner if taken and current.owner != owner else None)
+
+    @classmethod
+    def heartbeat(cls, name, owner, ttl_seconds):
+        """有効期限を延長する。リースを失っていれば False"""
+        now = timezone.now()
+        return bool(
+            cls.objects.filter(name=name, owner=owner)
+            .update(heartbeat_at=now, expires_at=now + timedelta(seconds=ttl_seconds))
+        )
+
+    @classmethod
+    def heartbeat_many(cls, names, owner, ttl_seconds):
+        """複数のリースの有効期限を1クエリで延長する。すべて保持していれば True"""
+        now = timezone.now()
+        updated = (
+            cls.objects.filter(name__in=names, owner=owner)
+            .update(heartbeat_at=now, expires_at=now + timedelta(seconds=ttl_seconds))
+        )
+        return updated == len(names)
+
+    @classmethod
+    def release(cls, name, owner):
+        cls.objects.filter(name=name, owner=owner).delete()
+
+    @classmethod
+    def release_many(cls, names, owner):
+        cls.objects.filter(name__in=names, owner=owner).delete()
+
+# ===== NotificationArchiveモデル =====
+class NotificationArchive(models.Model):
+    """保持期間を過ぎた既読通知の退避先（archive_notifications コマンドで移動する）"""
+    original_id = models.BigIntegerField(unique=True, verbose_name="元の通知ID")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # アイテム削除後も残すため外部キーにしない
+    item_ref_id = models.BigIntegerField(null=True, blank=True, verbose_name="アイテムID")
+    type = models.CharField(max_length=10, choices=Notification.TYPE_CHOICES, verbose_name="通知種別")
+    title = models.CharField(max_length=200, verbose_name="通知タイトル")
+    body = models.TextField(blank=True, verbose_name="通知本文")
+    item_ids = models.JSONField(default=list, blank=True, verbose_name="対象アイテムID")
+    item_count = models.PositiveIntegerField(default=1, verbose_name="対象アイテム数")
+    scheduled_for = models.DateTimeField(verbose_name="通知予定時刻")
+    scheduled_on = models.DateField(verbose_name="通知予定日")
+    read_at = models.DateTimeField(null=True, blank=True, verbose_name="既読時刻")
+    created_at = models.DateTimeField(verbose_name="作成日時")
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name="アーカイブ日時")
+
+    class Meta:
+        verbose_name = "通知アーカイブ"
+        verbose_name_plural = "通知アーカイブ"
+        ordering = ['-scheduled_for']
+
+    def __str__(self):
+        return f"{self.title} - {self.user}"
+
+    @classmethod
+    def from_notification(cls, notification, read_at=None):
+        return cls(
+            original_id=notification.id,
+            user_id=notification.user_id,
+            item_ref_id=notification.item_id,
+            type=notification.type,
+            title=notification.title,
+            body=notification.body,
+            item_ids=notification.item_ids,
+            item_count=notification.item_count,
+            scheduled_for=notification.scheduled_for,
+            scheduled_on=notification.scheduled_on,
+            read_at=read_at,
+            created_at=notification.created_at,
+        )
+
 # ===== LlmSuggestionLogモデル（修正版） =====
 class LlmSuggestionLog(BaseModel):
     """LLM提案ログ"""
@@ -0,0 +1,162 @@
+# beauty/search.py
+"""
+アイテムの全文検索（商品名・ブランド・メモ）
+- SQLite では FTS5（trigram トークナイザ）の索引 beauty_item_fts を使う。分かち書き不要で日本語も部分一致する
+- 索引は install_fts が作るトリガーで beauty_item と同期する（migrations から呼ぶ。
+  SQLite はテーブルを作り直すマイグレーションでトリガーも消えるため、その後にも呼び直す）
+- FTS5 が無い DB では icontains（LIKE）で絞り込む
+- 商品名・ブランドは search_key で正規化したキー（name_key / brand_key）も検索対象にする
+"""
+from functools import lru_cache
+import unicodedata
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'beauty_item_fts'
+
+# trigram は3文字単位で索引するため、これより短い語は索引で引けない
+MIN_TERM_LENGTH = 3
+
+# bm25 の列の重み（商品名 > ブランド > メモ、正規化キーは元の列と同じ）
+RANK_WEIGHTS = (10.0, 5.0, 1.0, 10.0, 5.0)
+
+# カタカナ（ァ〜ヶ）をひらがなに寄せる
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(0x30A1, 0x30F7)}
+
+# 前方一致を範囲検索にするための上限（key 以上 key + この文字未満）
+_PREFIX_END = '\U0010ffff'
+
+
+def search_key(text):
+    """
+    表記ゆれを吸収した検索キー
+    NFKC（全角英数・半角カナの統一）→ 小文字化 → カタカナをひらがなに → 空白を除去
+    ローマ字とかなの読み替えはしない
+    """
+    text = unicodedata.normalize('NFKC', text or '').casefold().translate(_KATAKANA_TO_HIRAGANA)
+    return ''.join(text.split())
+
+
+def prefix_range(field, key):
+    """key で始まる値の範囲条件（LIKE と違い通常のインデックスで引ける）"""
+    return Q(**{f'{field}__gte': key, f'{field}__lt': key + _PREFIX_END})
+
+
+@lru_cache(maxsize=None)
+def fts_available():
+    """FTS 索引があるか（マイグレーションで作れなかった DB では False）"""
+    if connection.vendor != 'sqlite':
+        return False
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+# 索引する列（bm25 の重みと同じ順）
+FTS_COLUMNS = ('name', 'brand', 'memo', 'name_key', 'brand_key')
+
+
+def _fts_statements():
+    columns = ', '.join(FTS_COLUMNS)
+    new_values = ', '.join(f'new.{c}' for c in FTS_COLUMNS)
+    old_values = ', '.join(f'old.{c}' for c in FTS_COLUMNS)
+    delete_old = (
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    )
+    insert_new = f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values});"
+    return [
+        # 本文は beauty_item を参照する外部コンテンツ型（索引だけを持つ）
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        f"{columns}, content='beauty_item', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER beauty_item_fts_ai AFTER INSERT ON beauty_item BEGIN {insert_new} END",
+        f"CREATE TRIGGER beauty_item_fts_ad AFTER DELETE ON beauty_item BEGIN {delete_old} END",
+        # 検索対象の列が変わったときだけ索引を更新する（通知日などの一括更新では動かない）
+        f"CREATE TRIGGER beauty_item_fts_au AFTER UPDATE OF {columns} ON beauty_item "
+        f"BEGIN {delete_old} {insert_new} END",
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    ]
+
+
+def uninstall_fts(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for trigger in ('beauty_item_fts_ai', 'beauty_item_fts_ad', 'beauty_item_fts_au'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def install_fts(schema_editor):
+    """
+    FTS5（trigram、SQLite 3.34 以降）が使える場合に索引とトリガーを作り直し、既存の行から索引を作る
+    使えない DB では何もしない（search_items が LIKE で検索する）
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.beauty_fts_probe USING fts5(x, tokenize='trigram')")
+        except Exception:
+            return
+        cursor.execute('DROP TABLE temp.beauty_fts_probe')
+    uninstall_fts(schema_editor)
+    with schema_editor.connection.cursor() as cursor:
+        for sql in _fts_statements():
+            cursor.execute(sql)
+
+
+def _phrase(text):
+    return '"{}"'.format(text.replace('"', '""'))
+
+
+def match_expression(terms):
+    """
+    語を FTS5 の MATCH 式にする（各語をフレーズとして引用し、AND で結ぶ）
+    正規化キーが元の語と違えば、どちらかに一致すれば良いとする
+    """
+    groups = []
+    for term in terms:
+        key = search_key(term)
+        if key != term and len(key) >= MIN_TERM_LENGTH:
+            groups.append(f'({_phrase(term)} OR {_phrase(key)})')
+        else:
+            groups.append(_phrase(term))
+    return ' AND '.join(groups)
+
+
+def _contains(term):
+    """索引を使えない語の部分一致（元の列と正規化キーの列）"""
+    key = search_key(term)
+    q = Q(name__icontains=term) | Q(brand__icontains=term) | Q(memo__icontains=term)
+    if key:
+        q |= Q(name_key__contains=key) | Q(brand_key__contains=key)
+    return q
+
+
+def search_items(qs, text):
+    """
+    検索語（空白区切りで AND）で絞り込む
+    戻り値: (QuerySet, 関連度で並べられるか)。並べられる場合は search_rank（小さいほど関連度が高い）を付ける
+    """
+    terms = text.split()
+    indexed = [t for t in terms if len(t) >= MIN_TERM_LENGTH]
+    short = [t for t in terms if len(t) < MIN_TERM_LENGTH]
+
+    if not indexed or not fts_available():
+        # 索引を使えない語は部分一致（ユーザーで絞った後なので件数は小さい）
+        for term in terms:
+            qs = qs.filter(_contains(term))
+        return qs, False
+
+    match = match_expression(indexed)
+    qs = qs.filter(
+        id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (match,))
+    ).annotate(
+        search_rank=RawSQL(
+            f'SELECT bm25({FTS_TABLE}, %s, %s, %s, %s, %s) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = beauty_item.id',
+            (*RANK_WEIGHTS, match),
+        )
+    )
+    for term in short:
+        qs = qs.filter(_contains(term))
+    return qs, True
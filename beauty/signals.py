@@ -0,0 +1,29 @@
+# beauty/signals.py
+"""
+モデル変更に伴う派生データの更新とキャッシュの無効化
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from . import taxonomy
+from .models import Item, Notification, NotificationCounter, Taxon
+
+
+@receiver(post_save, sender=Taxon, dispatch_uid='beauty_taxon_saved')
+@receiver(post_delete, sender=Taxon, dispatch_uid='beauty_taxon_deleted')
+def invalidate_taxonomy(sender, **kwargs):
+    # コミット前に読み直すと古い木が新しいバージョンで残るため、コミット後に進める
+    transaction.on_commit(taxonomy.invalidate)
+
+
+@receiver(post_delete, sender=Taxon, dispatch_uid='beauty_taxon_leaf_on_delete')
+def refresh_parent_leaf_flag(sender, instance, **kwargs):
+    # 最後の子が削除された親は葉に戻る（CASCADE で親ごと削除された場合は何もしない）
+    if instance.parent_id:
+        Taxon.refresh_leaf_flags([instance.parent_id])
+
+
+@receiver(pre_delete, sender=Item, dispatch_uid='beauty_item_notifications_discarded')
+def discard_item_notifications(sender, instance, **kwargs):
+    # CASCADE で消えるアイテム単位の通知のうち未読の分を未読数から引く（ダイジェストは残るので件数も変えない）
+    NotificationCounter.discard(Notification.objects.filter(item_id=instance.pk))
@@ -49,8 +49,12 @@ function initExpiryChart() {
         });
 }
 
-// APIから期限統計データを取得
+// 期限統計データを取得（ページに埋め込まれていればそれを使い、無ければAPIから取得）
 async function fetchExpiryStats() {
+    const embedded = document.getElementById('expiryCounts');
+    if (embedded) {
+        return JSON.parse(embedded.textContent);
+    }
     try {
         const response = await fetch('/api/expiry-stats/');
         if (!response.ok) {
@@ -194,13 +194,13 @@ if (btnSuggest && apiUrl) {
 (() => {
   "use strict";
 
-  // 1) Djangoから埋め込んだtaxon_rules を読む
-  function loadTaxonRules() {
-    const el = document.getElementById("taxon-rules");
-    if (!el) return {};
+  // 1) 期限ルールはカテゴリ木一式（taxonomy.js）から読む
+  async function loadTaxonRules() {
     try {
-      return JSON.parse(el.textContent);
-    } catch {
+      const taxonomy = await window.loadTaxonomy();
+      return taxonomy.rules;
+    } catch (error) {
+      console.warn("[expiry] taxonomy not loaded", error);
       return {};
     }
   }
@@ -250,8 +250,8 @@ if (btnSuggest && apiUrl) {
   }
 
   // 4) メイン
-  function setupExpiry() {
-    const RULES = loadTaxonRules();
+  async function setupExpiry() {
+    const RULES = await loadTaxonRules();
     const { productSel, openedInput, expiresInput } = nodes();
 
     if (!productSel || !openedInput || !expiresInput) {
@@ -300,3 +300,88 @@ if (btnSuggest && apiUrl) {
     setupExpiry();
   }
 })();
+
+//===================== 商品名・ブランドの入力補完 =======================
+(() => {
+  "use strict";
+
+  // 入力が止まってから問い合わせるまでの待ち時間（ミリ秒）
+  const DEBOUNCE_MS = 200;
+
+  function setupAutocomplete(form, input, field) {
+    const url = form.dataset.autocompleteUrl;
+    const datalist = document.createElement("datalist");
+    datalist.id = `${input.id}-suggestions`;
+    input.after(datalist);
+    input.setAttribute("list", datalist.id);
+    input.setAttribute("autocomplete", "off");
+
+    const cache = new Map();
+    let timer = null;
+    let controller = null;
+
+    function render(candidates) {
+      datalist.replaceChildren(
+        ...candidates.map((value) => {
+          const option = document.createElement("option");
+          option.value = value;
+          return option;
+        })
+      );
+    }
+
+    async function lookup(q) {
+      if (cache.has(q)) {
+        render(cache.get(q));
+        return;
+      }
+      // 前の問い合わせは結果を待たずに取り消す
+      if (controller) controller.abort();
+      controller = new AbortController();
+      try {
+        const params = new URLSearchParams({ q, field });
+        const res = await fetch(`${url}?${params}`, {
+          credentials: "same-origin",
+          signal: controller.signal,
+        });
+        if (!res.ok) return;
+        const data = await res.json();
+        const candidates = data[`${field}s`] || [];
+        cache.set(q, candidates);
+        render(candidates);
+      } catch (error) {
+        if (error.name !== "AbortError") {
+          console.warn("[autocomplete] failed", error);
+        }
+      }
+    }
+
+    input.addEventListener("input", () => {
+      clearTimeout(timer);
+      const q = input.value.trim();
+      if (!q) {
+        render([]);
+        return;
+      }
+      timer = setTimeout(() => lookup(q), DEBOUNCE_MS);
+    });
+  }
+
+  function init() {
+    const form = document.getElementById("item-form");
+    if (!form || !form.dataset.autocompleteUrl) return;
+    [
+      ["id_name", "name"],
+      ["id_brand", "brand"],
+    ].forEach(([id, field]) => {
+      const input = document.getElementById(id);
+      if (input) setupAutocomplete(form, input, field);
+    });
+  }
+
+  if (document.readyState === "loading") {
+    document.addEventListener("DOMContentLoaded", init);
+  } else {
+    init();
+  }
+})();
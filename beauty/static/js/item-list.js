@@ -62,9 +62,15 @@ document.addEventListener('DOMContentLoaded', function() {
             });
         });
         
-        // 検索フォーム送信
+        // 検索フォーム送信（新しい検索語では関連度順にする）
+        const searchInput = searchForm.querySelector('input[type="text"][name="search"]');
+        const initialSearch = searchInput ? searchInput.value.trim() : '';
         searchForm.addEventListener('submit', function(e) {
             e.preventDefault();
+            const searchText = searchInput ? searchInput.value.trim() : '';
+            if (searchText && searchText !== initialSearch) {
+                sortSelect.value = 'relevance';
+            }
             applyFilters();
         });
     }
@@ -80,10 +86,9 @@ document.addEventListener('DOMContentLoaded', function() {
 
     async function loadMajorCategories() {
         try {
-            const response = await fetch('/api/taxons/');
-            const categories = await response.json();
+            const taxonomy = await window.loadTaxonomy();
             
-            populateSelect(majorCategorySelect, categories);
+            populateSelect(majorCategorySelect, taxonomy.children(null));
         } catch (error) {
             console.error('大カテゴリの読み込みに失敗:', error);
         }
@@ -110,10 +115,9 @@ document.addEventListener('DOMContentLoaded', function() {
 
     async function loadMiddleCategories(parentId) {
         try {
-            const response = await fetch(`/api/taxons/?parent=${parentId}`);
-            const categories = await response.json();
+            const taxonomy = await window.loadTaxonomy();
             
-            populateSelect(middleCategorySelect, categories);
+            populateSelect(middleCategorySelect, taxonomy.children(parentId));
         } catch (error) {
             console.error('中カテゴリの読み込みに失敗:', error);
         }
@@ -137,10 +141,9 @@ document.addEventListener('DOMContentLoaded', function() {
 
     async function loadMinorCategories(parentId) {
         try {
-            const response = await fetch(`/api/taxons/?parent=${parentId}`);
-            const categories = await response.json();
+            const taxonomy = await window.loadTaxonomy();
             
-            populateSelect(minorCategorySelect, categories);
+            populateSelect(minorCategorySelect, taxonomy.children(parentId));
         } catch (error) {
             console.error('小カテゴリの読み込みに失敗:', error);
         }
@@ -247,16 +250,58 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     // アイテムカードのホバーエフェクト
-    document.querySelectorAll('.item-card').forEach(card => {
-        card.addEventListener('mouseenter', function() {
-            this.style.transform = 'translateY(-2px)';
-            this.style.transition = 'transform 0.2s ease';
-        });
-        
-        card.addEventListener('mouseleave', function() {
-            this.style.transform = 'translateY(0)';
+    function setupCardHover(root) {
+        root.querySelectorAll('.item-card').forEach(card => {
+            card.addEventListener('mouseenter', function() {
+                this.style.transform = 'translateY(-2px)';
+                this.style.transition = 'transform 0.2s ease';
+            });
+            
+            card.addEventListener('mouseleave', function() {
+                this.style.transform = 'translateY(0)';
+            });
         });
-    });
+    }
+    setupCardHover(document);
+
+    // もっと見る（現在の絞り込み条件のまま、最後のカードの続きを取得）
+    const loadMoreBtn = document.getElementById('loadMore');
+    const itemGrid = document.getElementById('itemGrid');
+    if (loadMoreBtn && itemGrid) {
+        loadMoreBtn.addEventListener('click', loadMoreItems);
+    }
+
+    async function loadMoreItems() {
+        const params = new URLSearchParams(window.location.search);
+        params.set('after', loadMoreBtn.dataset.cursor);
+
+        loadMoreBtn.disabled = true;
+        try {
+            const response = await fetch(`${window.location.pathname}?${params}`, {
+                credentials: 'same-origin',
+                headers: { 'X-Requested-With': 'XMLHttpRequest' },
+            });
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            const data = await response.json();
+
+            const fragment = document.createElement('div');
+            fragment.innerHTML = data.html;
+            setupCardHover(fragment);
+            itemGrid.append(...fragment.children);
+
+            if (data.next_cursor) {
+                loadMoreBtn.dataset.cursor = data.next_cursor;
+                loadMoreBtn.disabled = false;
+            } else {
+                loadMoreBtn.closest('.row').remove();
+            }
+        } catch (error) {
+            console.error('続きの読み込みに失敗:', error);
+            loadMoreBtn.disabled = false;
+        }
+    }
 
     // ローディング状態の管理
     function showLoading() {
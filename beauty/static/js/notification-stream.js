@@ -0,0 +1,49 @@
+/**
+ * 通知バッジの SSE 接続（ASGI で動かしているときだけ base.html が読み込む）
+ * - 接続先は json_script の notification-stream-url
+ * - 受信したサマリーは notifications.js の applyNotificationSummary で反映する
+ */
+
+// タブごとに1本だけ持つ SSE 接続
+let notificationStream = null;
+
+/**
+ * 通知サマリーの SSE に接続する
+ * @returns {boolean} 接続を開始したか
+ */
+window.connectNotificationStream = function () {
+  const urlElement = document.getElementById("notification-stream-url");
+  if (!window.USER_AUTHENTICATED || !window.EventSource || !urlElement) {
+    return false;
+  }
+  if (notificationStream) {
+    return true;
+  }
+
+  let received = false;
+  notificationStream = new EventSource(JSON.parse(urlElement.textContent));
+
+  notificationStream.addEventListener("summary", (event) => {
+    received = true;
+    applyNotificationSummary(JSON.parse(event.data));
+  });
+
+  notificationStream.addEventListener("error", () => {
+    // 認証エラーなどで閉じられた場合は JSON サマリーにフォールバック
+    if (notificationStream.readyState === EventSource.CLOSED) {
+      notificationStream = null;
+      if (!received) {
+        loadNotificationSummary();
+      }
+    }
+  });
+
+  // ページを離れるときは接続を閉じる
+  window.addEventListener("pagehide", () => {
+    if (notificationStream) {
+      notificationStream.close();
+      notificationStream = null;
+    }
+  });
+  return true;
+};
@@ -1,13 +1,15 @@
 /**
  * 通知機能のJavaScript
- * - 未読通知バッジの更新
+ * - 未読通知バッジの更新（ASGI では notification-stream.js の SSE で受信、それ以外は JSON サマリーを取得）
  * - アコーディオン見出しクリック時の既読処理
  * - ページ遷移処理
  */
 
 document.addEventListener("DOMContentLoaded", function () {
-  // 通知サマリーを取得してバッジを更新
-  loadNotificationSummary();
+  // 通知サマリーを受信してバッジを更新（SSE のスクリプトが無い・使えなければ1回だけ取得）
+  if (!(window.connectNotificationStream && window.connectNotificationStream())) {
+    loadNotificationSummary();
+  }
 
   // 通知ヘッダーのクリックイベントを設定
   setupNotificationHandlers();
@@ -61,20 +63,27 @@ function loadNotificationSummary() {
     })
     .then((data) => {
       if (!data) return;
-
-      // 全体バッジ更新（既存処理）
-      updateNotificationBadge(data.total_unread);
-
-      // 各期限ごとの件数バッジ更新
-      if (data.buckets) {
-        updatePerBucketBadges(data.buckets);
-      }
+      applyNotificationSummary(data);
     })
     .catch((error) => {
       console.error("通知サマリー取得エラー:", error);
     });
 }
 
+/**
+ * サマリー（JSON / SSE 共通の形）をバッジに反映する
+ * @param {object} data - {"buckets": {...}, "total_unread": 6}
+ */
+function applyNotificationSummary(data) {
+  // 全体バッジ更新（既存処理）
+  updateNotificationBadge(data.total_unread);
+
+  // 各期限ごとの件数バッジ更新
+  if (data.buckets) {
+    updatePerBucketBadges(data.buckets);
+  }
+}
+
 /**
  * 通知バッジを更新
  * @param {number} totalUnread - 未読総数
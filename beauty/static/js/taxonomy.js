@@ -0,0 +1,63 @@
+/*!
+ * カテゴリ木（大 > 中 > 小）の読み込み
+ * URLに内容ハッシュが入っているため、カテゴリが変わるまでブラウザのキャッシュを使う
+ */
+
+(function() {
+    'use strict';
+
+    let pending = null;
+
+    function bundleUrl() {
+        const el = document.getElementById('taxonomy-bundle-url');
+        return el ? JSON.parse(el.textContent) : null;
+    }
+
+    function build(data) {
+        const byId = new Map();
+        const children = new Map();
+        const rules = {};
+
+        // サーバー側で階層・名前順に並んでいるので、その順のまま子リストを作る
+        data.taxons.forEach(taxon => {
+            byId.set(taxon.id, taxon);
+            const key = taxon.parent ?? null;
+            if (!children.has(key)) {
+                children.set(key, []);
+            }
+            children.get(key).push(taxon);
+            rules[taxon.id] = { months: taxon.months, anchor: taxon.anchor };
+        });
+
+        return {
+            get: id => byId.get(Number(id)),
+            // parentId が空なら大カテゴリ
+            children: parentId => children.get(parentId ? Number(parentId) : null) || [],
+            leaves: () => data.taxons.filter(taxon => taxon.leaf),
+            rules: rules,
+        };
+    }
+
+    // 1ページ内では一度だけ取得して使い回す
+    window.loadTaxonomy = function() {
+        if (!pending) {
+            const url = bundleUrl();
+            if (!url) {
+                return Promise.reject(new Error('taxonomy-bundle-url がありません'));
+            }
+            pending = fetch(url, { credentials: 'same-origin' })
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then(build)
+                .catch(error => {
+                    pending = null;
+                    throw error;
+                });
+        }
+        return pending;
+    };
+})();
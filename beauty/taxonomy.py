@@ -0,0 +1,205 @@
+# beauty/taxonomy.py
+"""
+カテゴリ木のプロセス内スナップショット
+- カテゴリは管理者が編集したときしか変わらないため、全件を1クエリで読み込んで使い回す
+- Taxon の保存・削除で signals.py がバージョンを進め、次の参照時に読み直す
+- バージョンは Django のキャッシュに置く（複数プロセスで共有するには共有キャッシュを設定する）
+  値は毎回新しいトークンにし、期限なしで置く（キーが消えても以前の値には戻らない）
+- キャッシュを共有しない構成（既定のプロセス内メモリ）でも他プロセスでの変更を取り込めるよう、
+  DB_CHECK_INTERVAL 秒ごとに DB の件数・最終更新日時を確かめ、変わっていれば読み直す
+- フロント向けには木全体を1つの JSON（bundle）にまとめ、内容ハッシュ付きURLで配信する
+"""
+from dataclasses import dataclass
+from functools import cached_property
+from types import MappingProxyType
+import gzip
+import hashlib
+import json
+import threading
+import time
+import uuid
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.urls import reverse
+
+VERSION_CACHE_KEY = 'beauty:taxonomy:version'
+
+# DB の件数・最終更新日時を確かめる間隔（秒）。キャッシュを共有しない他プロセスでの変更はこの間隔で反映される
+DB_CHECK_INTERVAL = 30
+
+_lock = threading.Lock()
+_snapshot = None
+_checked_at = 0.0
+
+
+@dataclass(frozen=True)
+class TaxonNode:
+    """カテゴリ1件分（読み取り専用）"""
+    id: int
+    name: str
+    parent_id: int | None
+    depth: int
+    is_leaf: bool
+    breadcrumb: str            # 大 > 中 > 小
+    shelf_life_months: int
+    shelf_life_anchor: str
+
+
+class TaxonomySnapshot:
+    """ある時点のカテゴリ木（変更しない）"""
+
+    def __init__(self, version, nodes, stamp=None):
+        self.version = version
+        # 読み込んだ時点の DB の (件数, 最終更新日時)
+        self.stamp = stamp
+        self.nodes = MappingProxyType({node.id: node for node in nodes})
+
+        children = {}
+        for node in sorted(nodes, key=lambda n: n.name):
+            children.setdefault(node.parent_id, []).append(node)
+        self._children = {parent_id: tuple(c) for parent_id, c in children.items()}
+
+        # 葉ノード（小カテゴリ）
+        self.leaves = tuple(sorted((n for n in nodes if n.is_leaf), key=lambda n: n.name))
+
+    @cached_property
+    def bundle(self):
+        """フロント用のカテゴリ木一式（JSON bytes、階層・名前順）"""
+        taxons = [
+            {
+                'id': n.id,
+                'name': n.name,
+                'parent': n.parent_id,
+                'leaf': n.is_leaf,
+                'path': n.breadcrumb,
+                'months': n.shelf_life_months,
+                'anchor': n.shelf_life_anchor,
+            }
+            for n in sorted(self.nodes.values(), key=lambda n: (n.depth, n.name))
+        ]
+        return json.dumps({'taxons': taxons}, ensure_ascii=False, separators=(',', ':')).encode()
+
+    @cached_property
+    def bundle_gzip(self):
+        # mtime を固定して同じ内容なら同じバイト列にする
+        return gzip.compress(self.bundle, mtime=0)
+
+    @cached_property
+    def bundle_hash(self):
+        return hashlib.sha256(self.bundle).hexdigest()[:16]
+
+    def get(self, taxon_id):
+        return self.nodes.get(taxon_id)
+
+    def children(self, parent_id=None):
+        """子カテゴリを名前順で返す（parent_id=None は大カテゴリ）"""
+        return self._children.get(parent_id, ())
+
+    def leaf_choices(self):
+        """葉ノードの (id, パンくず) を階層・名前順で返す（フォームの選択肢用）"""
+        return [(n.id, n.breadcrumb) for n in sorted(self.leaves, key=lambda n: (n.depth, n.name))]
+
+
+def _new_version():
+    return uuid.uuid4().hex
+
+
+def current_version():
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        # キャッシュから消えた場合も、過去に使った値ではなく新しい値で始める（読み直しになるだけ）
+        version = _new_version()
+        cache.add(VERSION_CACHE_KEY, version, None)
+        version = cache.get(VERSION_CACHE_KEY, version)
+    return version
+
+
+def invalidate():
+    """バージョンを新しい値にする（次の get_snapshot() で読み直す）"""
+    cache.set(VERSION_CACHE_KEY, _new_version(), None)
+
+
+def get_snapshot():
+    """
+    現在のバージョンのスナップショットを返す（古ければ1クエリで読み直す）
+    バージョンが同じでも DB_CHECK_INTERVAL 秒ごとに DB の件数・最終更新日時を確かめ、変わっていれば読み直す
+    """
+    global _snapshot, _checked_at
+    version = current_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        if time.monotonic() - _checked_at < DB_CHECK_INTERVAL:
+            return snapshot
+        _checked_at = time.monotonic()
+        if _db_stamp() == snapshot.stamp:
+            return snapshot
+        # 他プロセスでの変更（このプロセスのキャッシュには届いていない）
+        invalidate()
+        version = current_version()
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = _build(version)
+            _checked_at = time.monotonic()
+        return _snapshot
+
+
+def bundle_url():
+    """現在のカテゴリ木一式のURL（内容が変わるとURLも変わる）"""
+    return reverse('beauty:taxonomy_bundle', args=[get_snapshot().bundle_hash])
+
+
+def get_node(taxon_id):
+    """
+    1件取得。スナップショットに無い場合は別プロセスでの追加を取りこぼしている可能性があるため、
+    DBに存在すれば読み直す
+    """
+    from .models import Taxon
+
+    node = get_snapshot().get(taxon_id)
+    if node is None and Taxon.objects.filter(id=taxon_id).exists():
+        invalidate()
+        node = get_snapshot().get(taxon_id)
+    return node
+
+
+def _db_stamp():
+    """カテゴリの (件数, 最終更新日時)。追加・削除は件数で、編集は最終更新日時で変わる"""
+    from .models import Taxon
+
+    row = Taxon.objects.aggregate(count=Count('id'), latest=Max('updated_at'))
+    return row['count'], row['latest']
+
+
+def _build(version):
+    from .models import Taxon
+
+    # 行より先に読む（間に変更が入っても、次の確認で読み直すだけで済む）
+    stamp = _db_stamp()
+    rows = list(Taxon.objects.values(
+        'id', 'name', 'parent_id', 'depth', 'is_leaf', 'shelf_life_months', 'shelf_life_anchor'
+    ))
+    by_id = {row['id']: row for row in rows}
+
+    def breadcrumb(row):
+        names = []
+        seen = set()
+        while row is not None and row['id'] not in seen:
+            seen.add(row['id'])
+            names.append(row['name'])
+            row = by_id.get(row['parent_id'])
+        return ' > '.join(reversed(names))
+
+    nodes = [
+        TaxonNode(
+            id=row['id'],
+            name=row['name'],
+            parent_id=row['parent_id'],
+            depth=row['depth'],
+            is_leaf=row['is_leaf'],
+            breadcrumb=breadcrumb(row),
+            shelf_life_months=row['shelf_life_months'],
+            shelf_life_anchor=row['shelf_life_anchor'],
+        )
+        for row in rows
+    ]
+    return TaxonomySnapshot(version, nodes, stamp)
@@ -23,8 +23,11 @@ urlpatterns = [
     
     # API
     path('api/taxons/', views.api_taxons, name='api_taxons'),
+    path('api/taxonomy/<str:digest>.json', views.taxonomy_bundle, name='taxonomy_bundle'),
+    path('api/items/autocomplete/', views.item_autocomplete, name='item_autocomplete'),
     path('api/notifications/summary/', views.get_notifications_summary, name='notifications_summary'),
     path('api/notifications/mark-read/', views.mark_notifications_read, name='mark_notifications_read'),
+    path('api/notifications/stream/', views.notifications_stream, name='notifications_stream'),
     path("api/suggest_category/", views.suggest_category_api, name="suggest_category_api"),
     path("api/expiry-stats/", views.expiry_stats, name="api-expiry-stats"),
     path("api/category-stats/", views.category_stats, name="api-category-stats"),
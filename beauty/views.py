@@ -8,17 +8,30 @@ from django.utils.decorators import method_decorator
 from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_protect
 from django.views.decorators.http import require_POST, require_GET
-from django.http import Http404, JsonResponse, HttpRequest
+from django.http import Http404, HttpResponse, JsonResponse, HttpRequest, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.core.exceptions import PermissionDenied
 from django.utils import timezone
-from datetime import date, timedelta
+from datetime import date, datetime
 from .forms import SignUpForm, SignInForm, ItemForm, UserSettingsForm, PasswordChangeForm
-from .models import Taxon, LlmSuggestionLog, Item, Notification
+from .models import (
+    Taxon, LlmSuggestionLog, Item, NotificationCounter, NotificationReadMark, UserProfile,
+)
+import asyncio
 import json
 import os
+import re
+from asgiref.sync import sync_to_async
 from .llm import suggest_taxon_candidates
+from .expiry import EXPIRY_BUCKETS, RISK_DISPLAY, bucket_for, flag_counts
+from . import taxonomy
+from .search import prefix_range, search_items, search_key
 from openai import APITimeoutError
-from django.db.models import Count
+from django.db import transaction
+from django.db.models import Count, Q
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.cache import add_never_cache_headers, patch_cache_control, patch_vary_headers
 
 def terms(request):
     """利用規約ページを表示"""
@@ -31,49 +44,59 @@ from datetime import date
 import calendar
 
 
+# カード表示に使う列（memo・image_url などの大きい列は読まない）
+# カードのテンプレートで参照する列を増やしたらここにも足す（足りないと1件ごとに追加クエリになる）
+CARD_FIELDS = (
+    'id', 'user_id', 'name', 'brand', 'image', 'status', 'expires_on', 'risk_flag',
+    'created_at', 'updated_at', 'product_type__name',
+)
+
+# カードを DB から読み込む単位
+CARD_CHUNK_SIZE = 100
+
+
+def card_queryset(qs):
+    """カード表示に必要な列だけを読む（カテゴリ名は JOIN で同時に取得）"""
+    return qs.select_related('product_type').only(*CARD_FIELDS)
+
+
 def get_all_items_qs(user):
     """
     「すべて」タブの条件と同じフィルタ＋並びでアイテムを取得する共通関数
     """
-    return Item.objects.filter(user=user).select_related('product_type').order_by('-created_at')
+    return card_queryset(Item.objects.filter(user=user)).order_by('-created_at')
 
 
-def build_items_with_data(qs):
+def card_cache_date(today):
     """
-    アイテムクエリセットから表示用データを構築する共通関数
+    カードの断片キャッシュのキーに加える今日の日付（残日数と期限バッジが日付で変わるため）
+    編集（updated_at）とカテゴリ名はテンプレート側でカードごとにキーへ入れる
     """
-    today = date.today()
-    items_with_data = []
-    
-    for item in qs:
+    return today.isoformat()
+
+
+def build_items_with_data(items, today):
+    """
+    アイテム（QuerySet またはリスト）から表示用データを1件ずつ作るジェネレータ
+    today はアイテムの持ち主の現地日付（UserProfile.local_today。保存済みの risk_flag と同じ基準）
+    QuerySet は iterator で少しずつ読み込み、テンプレートの for で消費されるまで組み立てない
+    """
+    if hasattr(items, 'iterator'):
+        items = items.iterator(chunk_size=CARD_CHUNK_SIZE)
+
+    for item in items:
         days_remaining = (item.expires_on - today).days
-        
-        # リスクレベル判定
-        if days_remaining < 0:
-            risk_level = 'expired'
-            risk_text = '期限切れ'
-        elif days_remaining <= 7:
-            risk_level = 'critical'
-            risk_text = '期限7日以内'
-        elif days_remaining <= 14:
-            risk_level = 'warning'
-            risk_text = '期限14日以内'
-        elif days_remaining <= 30:
-            risk_level = 'caution'
-            risk_text = '期限30日以内'
-        else:
-            risk_level = 'safe'
-            risk_text = '余裕あり'
-        
-        items_with_data.append({
+
+        # リスクレベルは期限日から今日の区分を判定（risk_flag は毎時の更新までずれることがある）
+        risk_level, risk_text, _ = RISK_DISPLAY[bucket_for(item.expires_on, today)]
+
+        yield {
             'item': item,
             'days_remaining': days_remaining,
             'days_remaining_abs': abs(days_remaining),
             'risk_level': risk_level,
             'risk_text': risk_text,
-        })
-    
-    return items_with_data
+        }
 
 
 @login_required
@@ -84,12 +107,18 @@ def home(request):
     ログイン必須
     """
     # 最近登録されたアイテムを取得（新しい順に4件）
+    today = UserProfile.local_today(request.user.id)
     recent_items_qs = get_all_items_qs(request.user)[:4]
-    recent_items_data = build_items_with_data(recent_items_qs)
+    recent_items_data = build_items_with_data(recent_items_qs, today)
     
+    # 期限別グラフの件数はページに埋め込む（/api/expiry-stats/ の取得を省く）
+    expiry_counts = flag_counts(Item.objects.filter(user=request.user))
+
     # home.html にデータを渡す
     context = {
         'recent_items_data': recent_items_data,
+        'card_cache_date': card_cache_date(today),
+        'expiry_counts': expiry_counts,
     }
 
     return render(request, 'home.html', context)
@@ -279,7 +308,7 @@ def item_new(request):
             
             # --- 保険：期限の自動計算（画面JSが動かない場合に備える） ---
             if not item.expires_on and item.product_type_id and item.opened_on:
-                taxon = Taxon.objects.only('shelf_life_months', 'shelf_life_anchor').get(id=item.product_type_id)
+                taxon = taxonomy.get_node(item.product_type_id)
                 item.expires_on = _calc_expiry(item.opened_on, taxon.shelf_life_months, taxon.shelf_life_anchor)
                 item.expires_overridden = False
             else:
@@ -310,7 +339,9 @@ def item_new(request):
                     # エラーが発生した場合はログに記録
                     print(f"画像アップロード処理中にエラーが発生: {e}")
                     messages.warning(request, "画像のアップロードに問題が発生しました。別の画像を試してください。")
-            
+
+            # 次回通知日を計算（通知生成は next_alert_on の範囲検索で対象を拾う）
+            item.refresh_next_alert()
             item.save()
             
             messages.success(
@@ -326,16 +357,11 @@ def item_new(request):
     else:
         form = ItemForm()
     
-    # --- Taxonごとの期限ルールをテンプレに渡す ---
-    taxon_rules = {
-        str(t.id): {"months": t.shelf_life_months, "anchor": t.shelf_life_anchor}
-        for t in Taxon.objects.only('id', 'shelf_life_months', 'shelf_life_anchor')
-    }
     context = {
         'form': form,
         'page_title': 'アイテム新規登録',
         'page_description': '新しいコスメアイテムを登録します',
-        'taxon_rules': taxon_rules,
+        'taxonomy_bundle_url': taxonomy.bundle_url(),
     }
     
     return render(request, 'items/new.html', context)
@@ -363,16 +389,12 @@ def item_edit(request, id):
         #  フォームに変更がなければそのまま戻る
         if not form.has_changed():
             messages.info(request, '変更はありません。')
-            taxon_rules = {
-                str(t.id): {"months": t.shelf_life_months, "anchor": t.shelf_life_anchor}
-                for t in Taxon.objects.only('id', 'shelf_life_months', 'shelf_life_anchor')
-            }
             return render(request, 'items/edit.html', {
                 'form': form,
                 'item': item,
                 'page_title': f'アイテム編集 - {item.name}',
                 'page_description': f'{item.name}の情報を編集します',
-                'taxon_rules': taxon_rules,
+                'taxonomy_bundle_url': taxonomy.bundle_url(),
             })
 
         if form.is_valid():
@@ -409,7 +431,7 @@ def item_edit(request, id):
 
             if (changed_product_type or changed_opened_on) and not changed_expires_on:
                 if updated.product_type_id and updated.opened_on:
-                    taxon = Taxon.objects.only('shelf_life_months', 'shelf_life_anchor').get(id=updated.product_type_id)
+                    taxon = taxonomy.get_node(updated.product_type_id)
                     updated.expires_on = _calc_expiry(
                         updated.opened_on, taxon.shelf_life_months, taxon.shelf_life_anchor
                     )
@@ -417,6 +439,8 @@ def item_edit(request, id):
             elif changed_expires_on:
                 updated.expires_overridden = True
 
+            # 期限が変わっている可能性があるため次回通知日を再計算
+            updated.refresh_next_alert()
             updated.save()
             messages.success(request, 'アイテム情報を更新しました。')
             return redirect('beauty:item_detail', id=updated.id)
@@ -427,22 +451,57 @@ def item_edit(request, id):
     else:
         form = ItemForm(instance=item)
 
-    taxon_rules = {
-        str(t.id): {"months": t.shelf_life_months, "anchor": t.shelf_life_anchor}
-        for t in Taxon.objects.only('id', 'shelf_life_months', 'shelf_life_anchor')
-    }
-
     context = {
         'form': form,
         'item': item,
         'page_title': f'アイテム編集 - {item.name}',
         'page_description': f'{item.name}の情報を編集します',
-        'taxon_rules': taxon_rules,
+        'taxonomy_bundle_url': taxonomy.bundle_url(),
     }
     return render(request, 'items/edit.html', context)
  
 
 
+# アイテム一覧の1ページあたりの件数
+ITEMS_PAGE_SIZE = 30
+
+
+def paginate_by_keyset(qs, ordering, cursor):
+    """
+    (ソートキー, id) のキーセットで1ページ分を取得する
+    - cursor は前ページ最後のアイテムの "値~id"（不正値は先頭ページ扱い）
+    - OFFSET を使わないので何ページ目でも同じコストで取得できる
+    - search_rank（検索の関連度）は数値のまま cursor にする
+    戻り値: (アイテムのリスト, 次ページの cursor または '')
+    """
+    field = ordering.lstrip('-')
+    descending = ordering.startswith('-')
+    qs = qs.order_by(ordering, '-id' if descending else 'id')
+
+    if cursor:
+        try:
+            raw_value, raw_id = cursor.rsplit('~', 1)
+            parse = {'expires_on': date.fromisoformat, 'search_rank': float}.get(field, datetime.fromisoformat)
+            value = parse(raw_value)
+            last_id = int(raw_id)
+        except ValueError:
+            pass
+        else:
+            if descending:
+                qs = qs.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': last_id}))
+            else:
+                qs = qs.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': last_id}))
+
+    # 1件多く取得して続きの有無を判定する
+    items = list(qs[:ITEMS_PAGE_SIZE + 1])
+    if len(items) <= ITEMS_PAGE_SIZE:
+        return items, ''
+    items = items[:ITEMS_PAGE_SIZE]
+    last = items[-1]
+    value = getattr(last, field)
+    return items, f'{value.isoformat() if hasattr(value, "isoformat") else repr(value)}~{last.id}'
+
+
 @login_required
 def item_list(request):
     """アイテム一覧ビュー（期限タブは再読み込み型）"""
@@ -473,56 +532,42 @@ def item_list(request):
     state        = request.GET.get('state', '').strip()
     sort         = request.GET.get('sort', 'expires_on').strip()
 
-    # ---- 日付境界（相互排他）----
-    today = date.today()
-    d7  = today + timedelta(days=7)
-    d14 = today + timedelta(days=14)
-    d30 = today + timedelta(days=30)
-
     # ---- ベースクエリ（このユーザーのものだけ）----
-    base_qs = Item.objects.filter(user=request.user).select_related('product_type')
+    base_qs = card_queryset(Item.objects.filter(user=request.user))
 
-    # ---- 検索 ----
+    # ---- 検索（商品名・ブランド・メモ。FTS 索引があれば関連度も付く）----
+    ranked = False
     if search:
-        base_qs = base_qs.filter(name__icontains=search)
+        base_qs, ranked = search_items(base_qs, search)
 
     # ---- カテゴリ（自身＋子孫を含める）----
+    # 大・中分類はアイテムの写しの列、それより下は祖先・子孫テーブルのサブクエリで絞る
     if product_type:
         try:
-            target_id = int(product_type)
-            descendant_ids = [target_id]
-            # 簡易BFSで子孫を収集（再帰より安全）
-            queue = [target_id]
-            while queue:
-                pid = queue.pop(0)
-                children = list(Taxon.objects.filter(parent_id=pid).values_list('id', flat=True))
-                descendant_ids.extend(children)
-                queue.extend(children)
-            base_qs = base_qs.filter(product_type_id__in=descendant_ids)
-        except (ValueError, Taxon.DoesNotExist):
+            node = taxonomy.get_node(int(product_type))
+        except ValueError:
+            node = None
+        if node is None:
             pass
+        elif node.depth == 0:
+            base_qs = base_qs.filter(category_root_id=node.id)
+        elif node.depth == 1:
+            base_qs = base_qs.filter(category_middle_id=node.id)
+        elif node.is_leaf:
+            base_qs = base_qs.filter(product_type_id=node.id)
+        else:
+            base_qs = base_qs.filter(product_type_id__in=Taxon.subtree_ids(node.id))
 
     # ---- ステータス ----
     if status in ['using', 'finished']:
         base_qs = base_qs.filter(status=status)
 
-    # ---- タブごとのフィルタ（カードのバッジと完全一致：相互排他）----
+    # ---- タブごとのフィルタ（保存済みの期限区分：相互排他）----
+    # 区分もカードのバッジも持ち主の現地日付で判定する。日付が変わってから refresh_risk_flags が
+    # 更新するまで（毎時実行で最大1時間）は、前日の区分のタブに今日のバッジのカードが出ることがある
     qs = base_qs
-    if tab == 'expired':
-        # 期限切れ：今日より前
-        qs = base_qs.filter(expires_on__lt=today)
-    elif tab == 'week':
-        # 7日以内：今日〜7日後（含む）
-        qs = base_qs.filter(expires_on__gte=today, expires_on__lte=d7)
-    elif tab == 'biweek':
-        # 14日以内：8〜14日後（8日後 = d7+1）
-        qs = base_qs.filter(expires_on__gte=d7 + timedelta(days=1), expires_on__lte=d14)
-    elif tab == 'month':
-        # 30日以内：15〜30日後
-        qs = base_qs.filter(expires_on__gte=d14 + timedelta(days=1), expires_on__lte=d30)
-    elif tab == 'safe':
-        # 余裕あり：30日超
-        qs = base_qs.filter(expires_on__gt=d30)
+    if tab in EXPIRY_BUCKETS:
+        qs = base_qs.filter(risk_flag=tab)
     else:
         tab = 'all'  # 不正値は all 扱い
 
@@ -533,35 +578,46 @@ def item_list(request):
         'created_at': 'created_at',
         '-created_at': '-created_at'
     }
+    if ranked:
+        ORDERING_MAP['relevance'] = 'search_rank'
     
     # 不正値が来てもデフォルト（expires_on）にフォールバック
     ordering = ORDERING_MAP.get(sort, 'expires_on')
+    if ordering == 'expires_on':
+        sort = 'expires_on'  # 検索語なしの「関連度順」なども期限順として表示
 
-    # フィルタ済みクエリにソートを適用
-    qs = qs.order_by(ordering)
+    # ---- キーセットページング（ソートキー + id で続きから取得）----
+    page, next_cursor = paginate_by_keyset(qs, ordering, request.GET.get('after', ''))
 
-    # ---- カード表示用：残日数＆リスク文言 ----
-    items_with_data = build_items_with_data(qs)
+    # ---- カード表示用：残日数＆リスク文言（テンプレートの for で1件ずつ組み立てる）----
+    today = UserProfile.local_today(request.user.id)
+    items_with_data = build_items_with_data(page, today)
 
-    # ---- バッジ件数（相互排他の同じ境界で計算）----
-    counts = {
-        'all':     base_qs.count(),
-        'expired': base_qs.filter(expires_on__lt=today).count(),
-        'week':    base_qs.filter(expires_on__gte=today,                 expires_on__lte=d7).count(),
-        'biweek':  base_qs.filter(expires_on__gte=d7 + timedelta(days=1), expires_on__lte=d14).count(),
-        'month':   base_qs.filter(expires_on__gte=d14 + timedelta(days=1),expires_on__lte=d30).count(),
-        'safe':    base_qs.filter(expires_on__gt=d30).count(),
-    }
+    # 「もっと見る」: 続きのカードだけを返す
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        html = render_to_string('items/_item_cards.html', {
+            'items_with_data': items_with_data,
+            'card_cache_date': card_cache_date(today),
+        }, request=request)
+        return JsonResponse({'html': html, 'next_cursor': next_cursor})
+
+    # ---- バッジ件数（保存済みの期限区分ごとに1クエリ集計）----
+    counts = flag_counts(base_qs, include_all=True)
 
     # ---- レンダリング ----
     return render(request, 'items/item_list.html', {
         'items_with_data': items_with_data,   # テンプレート側は item.item / item.risk_text で参照
+        'has_items': bool(page),              # items_with_data はジェネレータなので件数の有無は別に渡す
+        'card_cache_date': card_cache_date(today),
+        'next_cursor': next_cursor,           # 続きが無ければ空文字
         'current_tab': tab,
         'current_sort': sort,
         'tab_counts': counts,
         'search': search,
+        'current_search': search,
         'product_type': product_type,
         'status': status,
+        'taxonomy_bundle_url': taxonomy.bundle_url(),
     })  
 
 
@@ -578,32 +634,13 @@ def item_detail(request, id):
         else:
             raise Http404("アイテムが見つかりません。")
     
-    # 残日数とリスクレベルを計算
-    today = date.today()
+    # 残日数とリスクレベルを計算（一覧と同じく持ち主の現地日付で）
+    today = UserProfile.local_today(item.user_id)
     days_remaining = (item.expires_on - today).days
     days_abs = abs(days_remaining)  # ←★ 追加：絶対値を計算
 
-    # リスクレベル判定
-    if days_remaining < 0:
-        risk_level = 'expired'
-        risk_text = '期限切れ'
-        risk_class = 'danger'
-    elif days_remaining <= 7:
-        risk_level = 'critical'
-        risk_text = '期限7日以内'
-        risk_class = 'warning'
-    elif days_remaining <= 14:
-        risk_level = 'warning'
-        risk_text = '期限14日以内'
-        risk_class = 'warning-orange'
-    elif days_remaining <= 30:
-        risk_level = 'caution'
-        risk_text = '期限30日以内'
-        risk_class = 'fine'
-    else:
-        risk_level = 'safe'
-        risk_text = '余裕あり'
-        risk_class = 'safety'
+    # リスクレベルは期限日から今日の区分を判定
+    risk_level, risk_text, risk_class = RISK_DISPLAY[bucket_for(item.expires_on, today)]
     
     context = {
         'item': item,
@@ -628,17 +665,82 @@ def api_taxons(request):
     
     if parent_id:
         try:
-            taxons = Taxon.objects.filter(parent_id=parent_id).order_by('name')
-        except:
+            parent_id = int(parent_id)
+        except ValueError:
             return JsonResponse({'error': 'Invalid parent ID'}, status=400)
     else:
         # 親がnullのTaxon（大カテゴリ）を取得
-        taxons = Taxon.objects.filter(parent__isnull=True).order_by('name')
+        parent_id = None
+    taxons = taxonomy.get_snapshot().children(parent_id)
     
     data = [{'id': t.id, 'name': t.name} for t in taxons]
     return JsonResponse(data, safe=False)
 
 
+# 入力補完の候補数
+AUTOCOMPLETE_LIMIT = 8
+
+
+@login_required
+@require_GET
+def item_autocomplete(request):
+    """
+    自分のアイテムの商品名・ブランドの前方一致候補（入力中の補完用）
+    ?q=入力中の文字列 &field=name|brand（省略時は両方）
+    表記ゆれは検索キー同士で比較し、候補は登録されている表記で返す
+    """
+    key = search_key(request.GET.get('q', ''))
+    field = request.GET.get('field')
+    fields = [field] if field in ('name', 'brand') else ['name', 'brand']
+
+    data = {'q': request.GET.get('q', '')}
+    for f in fields:
+        candidates = []
+        if key:
+            candidates = list(
+                Item.objects.filter(prefix_range(f'{f}_key', key), user=request.user)
+                .order_by(f'{f}_key')
+                .values_list(f, flat=True)
+                .distinct()[:AUTOCOMPLETE_LIMIT]
+            )
+        data[f'{f}s'] = candidates
+
+    response = JsonResponse(data)
+    # 入力のたびに同じ前方一致を問い合わせるため、短時間はブラウザのキャッシュを使わせる
+    patch_cache_control(response, private=True, max_age=60)
+    return response
+
+
+# GZipMiddleware と同じ判定
+_ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+@login_required
+@require_GET
+def taxonomy_bundle(request, digest):
+    """カテゴリ木一式（内容ハッシュ付きURL・長期キャッシュ）"""
+    snapshot = taxonomy.get_snapshot()
+    if digest != snapshot.bundle_hash:
+        # 古いページからの参照は現在の版へ（リダイレクト自体はキャッシュさせない）
+        response = redirect('beauty:taxonomy_bundle', digest=snapshot.bundle_hash)
+        add_never_cache_headers(response)
+        return response
+
+    etag = f'"{snapshot.bundle_hash}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponse(status=304)
+    elif _ACCEPTS_GZIP.search(request.headers.get('Accept-Encoding', '')):
+        response = HttpResponse(snapshot.bundle_gzip, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(snapshot.bundle, content_type='application/json')
+    response['ETag'] = etag
+    # URL が内容ごとに変わるため、同じURLは二度と変わらない
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
 @login_required
 @require_POST
 def mark_notifications_read(request):
@@ -650,23 +752,17 @@ def mark_notifications_read(request):
     if notification_type not in valid_types:
         return JsonResponse({'error': 'Invalid notification type'}, status=400)
     
-    # 該当ユーザーの指定タイプの未読通知を一括既読化
-    updated_count = Notification.objects.filter(
-        user=request.user,
-        type=notification_type,
-        read_at__isnull=True
-    ).update(read_at=timezone.now())
-    
-    # 更新後の未読総数を取得
-    unread_count = Notification.objects.filter(
-        user=request.user,
-        read_at__isnull=True
-    ).count()
-    
+    # 既読位置の UPSERT と未読数の更新を同じトランザクションで行う
+    with transaction.atomic():
+        counter = NotificationCounter.get_or_build(request.user.id)
+        updated_count = getattr(counter, NotificationCounter.TYPE_FIELDS[notification_type])
+        NotificationReadMark.mark_read(request.user.id, notification_type)
+        NotificationCounter.clear(request.user.id, notification_type)
+
     return JsonResponse({
         'success': True,
         'updated_count': updated_count,
-        'unread_total': unread_count
+        'unread_total': counter.total - updated_count
     })
 
 
@@ -674,56 +770,82 @@ def mark_notifications_read(request):
 def get_notifications_summary(request):
     """
     通知サマリー取得API（ヘッダー＆各行バッジ用）
-    - 未読のみタイプ別に集計
+    - 未読数はユーザーごとのカウンタ行（主キー検索1回）から返す
     - 返却は human な期限キー（expired/week/biweek/month）
     """
-    user = request.user
-
-    # DBを1クエリで集計（未読のみ）
-    qs = (Notification.objects
-          .filter(user=user, read_at__isnull=True)
-          .values('type')
-          .annotate(cnt=Count('id')))
-
-    # type -> 表示キー/タイトル の対応
-    type_map = {
-        'OVERWEEK': ('expired', '使用期限切れのアイテムがあります'),
-        'D7':       ('week',    '期限7日以内のアイテムがあります'),
-        'D14':      ('biweek',  '期限14日以内のアイテムがあります'),
-        'D30':      ('month',   '期限30日以内のアイテムがあります'),
-    }
-
-    # 0で初期化
-    buckets = {k: 0 for k, _ in type_map.values()}
-
-    # 旧構造の互換（必要なら残す）
-    notifications = {
-        t: {'count': 0, 'title': title, 'has_unread': False}
-        for t, (key, title) in {k: (v[0], v[1]) for k, v in type_map.items()}.items()
-    }
-
-    # 集計結果を反映
-    for row in qs:
-        t = row['type']
-        cnt = int(row['cnt'])
-        if t in type_map:
-            key, title = type_map[t]
-            buckets[key] = cnt
-            notifications[t] = {
-                'count': cnt,
-                'title': title,
-                'has_unread': cnt > 0
-            }
-
-    total_unread = sum(buckets.values())
+    counter = NotificationCounter.get_or_build(request.user.id)
+    buckets = counter.buckets()
 
     return JsonResponse({
         # 新：フロントで使いやすい期限キー別件数
         'buckets': buckets,                     # 例: {"expired":1,"week":3,"biweek":0,"month":2}
-        'total_unread': total_unread,          # 例: 6
+        'total_unread': counter.total,         # 例: 6
     })
 
 
+# 通知ストリーム（SSE）の間隔（秒）
+SSE_POLL_SECONDS = 2         # 変更の合図（キャッシュ）の確認。DB は読まない
+SSE_DB_POLL_SECONDS = 60     # 合図が無くてもカウンタを読み直す間隔（キャッシュを共有していない場合の保険）
+SSE_HEARTBEAT_SECONDS = 15   # 変化が無いときのコメント送信（プロキシの切断防止）
+SSE_MAX_SECONDS = 300        # 1接続の最大時間（ブラウザが retry 後に自動で再接続する）
+SSE_RETRY_SECONDS = 3        # 切断後に再接続するまでの待ち時間
+
+
+@require_GET
+async def notifications_stream(request):
+    """
+    通知サマリーの Server-Sent Events（ASGI で動かしたときのみ）
+    - 接続直後にサマリーを1回送り、以降は未読カウンタの version が変わったときだけ送る
+    - 変化はキャッシュの合図（NotificationCounter.signal_changed）で検知し、DB は合図があったときと
+      SSE_DB_POLL_SECONDS ごとにだけ読む
+    - WSGI ではページに接続用のスクリプトを出さない。直接呼ばれた場合は 204 を返す
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication required'}, status=401)
+
+    response = StreamingHttpResponse(_notification_events(user.id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx のバッファリングを無効化
+    return response
+
+
+async def _notification_events(user_id):
+    """未読カウンタの変化を SSE のイベント文字列として返す非同期ジェネレーター"""
+    # 合図はカウンタより先に読む（読み出しの間に変わった分を取りこぼさない）
+    change_key = NotificationCounter.change_key(user_id)
+    signal = await cache.aget(change_key)
+    counter = await sync_to_async(NotificationCounter.get_or_build)(user_id)
+    version = counter.version
+    yield f'retry: {SSE_RETRY_SECONDS * 1000}\n' + _sse_summary(counter)
+
+    loop = asyncio.get_running_loop()
+    started = last_sent = last_checked = loop.time()
+    while loop.time() - started < SSE_MAX_SECONDS:
+        await asyncio.sleep(SSE_POLL_SECONDS)
+        current_signal = await cache.aget(change_key)
+        counter = None
+        if current_signal != signal or loop.time() - last_checked >= SSE_DB_POLL_SECONDS:
+            signal = current_signal
+            last_checked = loop.time()
+            counter = await NotificationCounter.objects.filter(user_id=user_id).afirst()
+        if counter is not None and counter.version != version:
+            version = counter.version
+            last_sent = loop.time()
+            yield _sse_summary(counter)
+        elif loop.time() - last_sent >= SSE_HEARTBEAT_SECONDS:
+            last_sent = loop.time()
+            yield ': ping\n\n'
+
+
+def _sse_summary(counter):
+    """get_notifications_summary と同じ形の JSON を summary イベントにする"""
+    data = json.dumps({'buckets': counter.buckets(), 'total_unread': counter.total})
+    return f'id: {counter.version}\nevent: summary\ndata: {data}\n\n'
+
+
 @require_GET
 def notification_summary(request):
     if not request.user.is_authenticated:
@@ -740,6 +862,8 @@ def settings(request):
     # 現在の通知設定を取得（UserProfileがある場合）
     # 今回は簡易的にsessionで管理
     notifications_enabled = request.session.get('notifications_enabled', True)
+    profile = UserProfile.objects.filter(user=user).first()
+    current_timezone = profile.timezone if profile else UserProfile.DEFAULT_TIMEZONE
     
     if request.method == 'POST':
         action = request.POST.get('action')
@@ -759,6 +883,11 @@ def settings(request):
                 # 通知設定更新
                 notifications_enabled = settings_form.cleaned_data.get('notifications_enabled', False)
                 request.session['notifications_enabled'] = notifications_enabled
+
+                # タイムゾーン更新（通知生成はこの値で日付を判定する）
+                new_timezone = settings_form.cleaned_data.get('timezone') or UserProfile.DEFAULT_TIMEZONE
+                if new_timezone != current_timezone:
+                    UserProfile.objects.update_or_create(user=user, defaults={'timezone': new_timezone})
                 
                 messages.success(request, 'プロフィール設定を更新しました。')
                 return redirect('beauty:settings')
@@ -769,7 +898,8 @@ def settings(request):
             # パスワード変更
             settings_form = UserSettingsForm(initial={
                 'username': user.username,
-                'notifications_enabled': notifications_enabled
+                'notifications_enabled': notifications_enabled,
+                'timezone': current_timezone,
             })
             password_form = PasswordChangeForm(user=user, data=request.POST)
             
@@ -790,7 +920,8 @@ def settings(request):
         # GET request
         settings_form = UserSettingsForm(initial={
             'username': user.username,
-            'notifications_enabled': notifications_enabled
+            'notifications_enabled': notifications_enabled,
+            'timezone': current_timezone,
         })
         password_form = PasswordChangeForm(user=user)
     
@@ -814,8 +945,8 @@ def suggest_category_api(request):
         item_text = " / ".join([s for s in [name, brand] if s])
 
         # 葉ノードだけを候補集合として LLM に渡す（パンくず付き）
-        leafs = _leaf_taxa()
-        taxon_payload = [{"id": t.id, "name": t.name, "path": _breadcrumb(t)} for t in leafs]
+        leafs = taxonomy.get_snapshot().leaves
+        taxon_payload = [{"id": t.id, "name": t.name, "path": t.breadcrumb} for t in leafs]
 
         # 事前フィルタで候補集合を絞る（ヒット時は効果絶大）
         taxon_payload_pref = prefilter_taxons(taxon_payload, item_text)
@@ -854,24 +985,6 @@ def suggest_category_api(request):
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
-# --- 葉ノードだけを取得する関数（小カテゴリだけ抽出） ---
-def _leaf_taxa():
-    return (
-        Taxon.objects
-        .filter(children__isnull=True)
-        .select_related("parent")
-        .order_by("name")
-    )
-
-# --- パンくず（大 > 中 > 小）表記を作る補助 ---
-def _breadcrumb(taxon):
-    names = []
-    cur = taxon
-    while cur:
-        names.append(cur.name)
-        cur = cur.parent
-    return " > ".join(reversed(names))
-
 # --- アイテム登録ページ（GET表示） ---
 @login_required
 def item_create_view(request):
@@ -886,12 +999,13 @@ def item_create_view(request):
         form = ItemForm()
 
     # 葉ノードだけ抽出してパンくず形式に加工
-    leafs = _leaf_taxa()
-    taxon_leafs = [{"id": t.id, "breadcrumb": _breadcrumb(t)} for t in leafs]
+    leafs = taxonomy.get_snapshot().leaves
+    taxon_leafs = [{"id": t.id, "breadcrumb": t.breadcrumb} for t in leafs]
 
     context = {
         "form": form,
         "taxon_leafs": taxon_leafs,  # ← テンプレで {{ taxon_leafs }} に利用
+        "taxonomy_bundle_url": taxonomy.bundle_url(),
     }
     return render(request, "items/_form.html", context)
 
@@ -934,20 +1048,7 @@ def naive_fallback(payload, text, top_k=3):
 #棒グラフ
 @login_required
 def expiry_stats(request):
-    today = date.today()
-    d7  = today + timedelta(days=7)
-    d14 = today + timedelta(days=14)
-    d30 = today + timedelta(days=30)
-
-    qs = Item.objects.filter(user=request.user)
-
-    data = {
-        "expired": qs.filter(expires_on__lt=today).count(),
-        "week":    qs.filter(expires_on__gte=today,                     expires_on__lte=d7).count(),
-        "biweek":  qs.filter(expires_on__gte=d7 + timedelta(days=1),    expires_on__lte=d14).count(),
-        "month":   qs.filter(expires_on__gte=d14 + timedelta(days=1),   expires_on__lte=d30).count(),
-        "safe":    qs.filter(expires_on__gt=d30).count(),
-    }
+    data = flag_counts(Item.objects.filter(user=request.user))
     return JsonResponse(data)
 
 
@@ -956,22 +1057,23 @@ def expiry_stats(request):
 def category_stats(request):
     qs = Item.objects.filter(user=request.user)
 
-    #  外部キーは product_type（→ DB上は product_type_id）
+    # level=root / middle で大・中分類ごとに集計（アイテムの写しの列を使うので結合なし）
+    group_field = {
+        'root': 'category_root_id',
+        'middle': 'category_middle_id',
+    }.get(request.GET.get('level'), 'product_type_id')
     rows = (
-        qs.values('product_type_id')
+        qs.values(group_field)
           .annotate(count=Count('id'))
-          .order_by('product_type_id')
+          .order_by(group_field)
     )
 
-    # 使われているIDをまとめて取得し、id→表示名のマップを作成
-    ids = [r['product_type_id'] for r in rows if r['product_type_id'] is not None]
-    name_map = {t.id: str(t) for t in Taxon.objects.filter(id__in=ids)}
-
+    # 表示名はカテゴリ木のスナップショットから引く
+    snapshot = taxonomy.get_snapshot()
     labels, counts = [], []
     for r in rows:
-        pt_id = r['product_type_id']
-        labels.append(name_map.get(pt_id, '未設定'))
+        node = snapshot.get(r[group_field])
+        labels.append(node.breadcrumb if node else '未設定')
         counts.append(r['count'])
 
-
     return JsonResponse({"labels": labels, "counts": counts})
\ No newline at end of file
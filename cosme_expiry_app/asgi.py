@@ -5,6 +5,14 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+通知バッジのリアルタイム更新（/api/notifications/stream/ の Server-Sent Events）は
+ASGI サーバーで起動したときのみ有効です。例:
+
+    uvicorn cosme_expiry_app.asgi:application
+
+WSGI（runserver / gunicorn の同期ワーカー）ではページに接続用のスクリプトを出さず、JSON サマリーを1回取得します。
+配信側は未読数の変化をキャッシュで検知するため、複数プロセスで動かす場合は共有キャッシュを設定してください。
 """
 
 import os
@@ -64,13 +64,22 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'beauty' / 'templates'],
-        'APP_DIRS': True,
+        # loaders を明示するため APP_DIRS は使わない（app_directories.Loader が同じ役割）
+        'APP_DIRS': False,
         'OPTIONS': {
+            # コンパイル済みテンプレートをプロセス内で使い回す（DEBUG 時は変更を検知して読み直す）
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'beauty.context_processors.notification_stream',
             ],
         },
     },
@@ -82,10 +91,42 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # 通知生成を複数プロセスで並列実行しても書き込みロック待ちで直列化されるようにする
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
 
+# ===== Cache =====
+# 既定はプロセス内メモリ。複数プロセスで動かす場合は共有キャッシュを指定する
+# （カテゴリ木のバージョンもここに置くため、共有すると他プロセスでの変更がすぐ反映される。
+#   共有しない場合は beauty.taxonomy.DB_CHECK_INTERVAL 秒ごとの DB の確認で反映される）
+#   例: DJANGO_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+#       DJANGO_CACHE_LOCATION=redis://127.0.0.1:6379/1
+# カード表示の断片キャッシュは件数が多いため別の領域（fragments）に置き、default の値を押し出さないようにする
+FRAGMENT_CACHE_BACKEND = os.environ.get(
+    'DJANGO_FRAGMENT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+)
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'cosme-expiry'),
+    },
+    'fragments': {
+        'BACKEND': FRAGMENT_CACHE_BACKEND,
+        'LOCATION': os.environ.get('DJANGO_FRAGMENT_CACHE_LOCATION', 'cosme-expiry-fragments'),
+        # 断片のキーには日付が入るため、古い日付の分は1日で消えればよい
+        'TIMEOUT': 60 * 60 * 24,
+    },
+}
+if FRAGMENT_CACHE_BACKEND.endswith('LocMemCache'):
+    # 既定の300件では一覧数ページ分で入れ替わってしまう
+    CACHES['fragments']['OPTIONS'] = {'MAX_ENTRIES': 5000}
+
+
 # ===== Auth =====
 AUTH_PASSWORD_VALIDATORS = [
     {